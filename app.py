@@ -2,218 +2,543 @@ from flask import Flask
 from flask import render_template
 from flask import request
 from flask import jsonify
+from flask import Response
+import hashlib
 import pickle
 import os
-import pandas as pd
-import numpy as np
-from scipy.sparse import csr_matrix
-from sklearn.neighbors import NearestNeighbors
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, "main"))
+
+from config import Config
+from serving_artifact import ServingArtifact
+from title_resolver import TitleResolver
+from catalogue_store import CatalogueStore
+from hybrid_model import HybridRecommendationModel
+from request_coalescer import RequestCoalescer, ServerOverloaded
+from shard_router import ShardRouter, ShardUnavailable
+from popularity import PopularityTracker
+from http_cache import make_etag, encode_json, compress
+
+MODELS_DIR = str(Config.MODELS_DIR)
 
 app = Flask(__name__)
 
+NO_IMAGE_URL = "/static/images/no-image.jpg"
+
 # Load models and data
-def load_models():
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    models_dir = os.path.join(base_dir, "models")
-
-    models = {}
-    files = {
-        'cf_model': 'cf_model.pkl',
-        'book_pivot': 'book_pivot.pkl',
-        'tfidf': 'tfidf_vectorizer.pkl',
-        'content_sim_matrix': 'content_sim_matrix.pkl',
-        'title_to_idx': 'title_to_idx.pkl',
-        'books_content': 'books_content.pkl',
-        'final_rating': 'final_rating.pkl',
-        'books': 'books_data.pkl'
-    }
+def load_artifact():
+    """Load the serving-only artifact (NumPy arrays only)"""
+    file_path = os.path.join(MODELS_DIR, ServingArtifact.FILENAME)
+    if not os.path.exists(file_path):
+        return None
+    return ServingArtifact.load(file_path)
+
+MODEL_FILES = {
+    'cf_model': 'cf_model.pkl',
+    'book_pivot': 'book_pivot.pkl',
+    'cb_model': 'cb_model.pkl',
+    'books_content': 'books_content.pkl',
+    'final_rating': 'final_rating.pkl'
+}
 
-    for key, filename in files.items():
-        file_path = os.path.join(models_dir, filename)
+# With shard servers configured, the neighbor tables and metadata live there
+router = ShardRouter() if Config.SHARD_URLS else None
+artifact = load_artifact() if router is None else None
+catalogue = CatalogueStore.open(os.path.join(MODELS_DIR, CatalogueStore.DIRNAME))
+_legacy_models = {}
+
+def legacy_model(key):
+    """Lazily load one pickled model; these pull in pandas and scikit-learn
+    and are only needed for the live-compute fallback"""
+    if key not in _legacy_models:
+        file_path = os.path.join(MODELS_DIR, MODEL_FILES[key])
         with open(file_path, 'rb') as f:
-            models[key] = pickle.load(f)
+            _legacy_models[key] = pickle.load(f)
+    return _legacy_models[key]
+
+def build_title_resolver():
+    """Build the seed title resolver over the books the models can serve"""
+    if router is not None:
+        book_ids, titles, num_ratings = router.titles()
+        return TitleResolver(titles, popularity=num_ratings), book_ids
+    
+    if artifact is not None:
+        resolver = TitleResolver(artifact.titles.tolist(), popularity=artifact.arrays['num_ratings'].tolist())
+        return resolver, artifact.book_ids
+    
+    book_ids = legacy_model('book_pivot').index.to_numpy()
+    counts = legacy_model('final_rating').groupby('book_id')['rating'].count()
+    titles = [catalogue.title(int(book_id)) for book_id in book_ids]
+    resolver = TitleResolver(titles, popularity=counts.reindex(book_ids, fill_value=0).tolist())
+    return resolver, book_ids
+
+_title_resolver = build_title_resolver() if artifact is not None or router is not None else None
+
+def resolve_book(query):
+    """Map free text to a (book_id, title) pair, or None if nothing is close enough"""
+    global _title_resolver
+    if _title_resolver is None:
+        _title_resolver = build_title_resolver()
+    resolver, book_ids = _title_resolver
+    resolved = resolver.resolve(query)
+    if resolved is not None and resolved[2] == 1.0:
+        return int(book_ids[resolved[0]]), resolved[1]
 
-    return models
+    # An exact title anywhere in the catalogue beats a fuzzy served match
+    found = catalogue.find_title(query) if catalogue is not None else None
+    if found is not None:
+        return found
 
-models = load_models()
+    if resolved is None:
+        return None
+    return int(book_ids[resolved[0]]), resolved[1]
+
+def validate_image_url(img_url):
+    """Return the image URL, or the placeholder if it is not a valid http URL"""
+    if not isinstance(img_url, str) or not img_url.startswith('http'):
+        return NO_IMAGE_URL
+    return img_url
 
 # Recommendation functions
-def collaborative_recommendations(book_title, top_n=9):
+def artifact_recommendations(book_id, method, top_n=9):
+    """Generate recommendations from the precomputed neighbor tables"""
+    row = artifact.row_of(book_id)
+    if row is None:
+        # Books outside the trained set get precomputed author/publisher fallbacks
+        neighbors = artifact.fallback_neighbors(book_id, catalogue, top_n)
+    else:
+        neighbors = artifact.neighbors(method, row, top_n)
+
+    recs = []
+    for neighbor, score in neighbors:
+        book_info = artifact.book_info(neighbor)
+        recs.append({
+            'book_id': book_info['book_id'],
+            'title': book_info['title'],
+            'author': book_info['author'],
+            'year': book_info['year'],
+            'publisher': book_info['publisher'],
+            'image_url': validate_image_url(book_info['img_url']),
+            'score': score,
+            'type': method
+        })
+
+    return recs
+
+def shard_recommendation(book_info, method):
+    """Shape one book returned by the shard router like the other recommendation paths"""
+    return {
+        'book_id': book_info['book_id'],
+        'title': book_info['title'],
+        'author': book_info['author'],
+        'year': book_info['year'],
+        'publisher': book_info['publisher'],
+        'image_url': validate_image_url(book_info['img_url']),
+        'score': book_info['score'],
+        'type': method
+    }
+
+def sharded_recommendations(book_id, methods, top_n=9):
+    """Generate recommendations of several methods through the shard router"""
+    try:
+        results = router.recommendations(book_id, methods, top_n)
+    except ShardUnavailable as e:
+        print(f"Error in sharded recommendations: {e}")
+        return {method: [] for method in methods}
+    
+    return {method: [shard_recommendation(book_info, method) for book_info in recs]
+            for method, recs in results.items()}
+
+def collaborative_recommendations(book_id, top_n=9):
     """Generate collaborative filtering recommendations"""
+    if router is not None:
+        return sharded_recommendations(book_id, ['collaborative'], top_n)['collaborative']
+    if artifact is not None:
+        return artifact_recommendations(book_id, 'collaborative', top_n)
+
     try:
-        if book_title not in models['book_pivot'].index:
+        book_pivot = legacy_model('book_pivot')
+        if book_id not in book_pivot.index:
             return []
-            
-        book_idx = np.where(models['book_pivot'].index == book_title)[0][0]
-        distances, indices = models['cf_model'].kneighbors(
-            models['book_pivot'].iloc[book_idx, :].values.reshape(1, -1),
-            n_neighbors=top_n+1)
-        
+
+        book_idx = book_pivot.index.get_loc(book_id)
+        distances, indices = legacy_model('cf_model').model.kneighbors(
+            book_pivot.iloc[book_idx, :].values.reshape(1, -1),
+            n_neighbors=min(top_n+1, len(book_pivot)))
+
         recs = []
         for i in range(1, len(indices.flatten())):
-            title = models['book_pivot'].index[indices.flatten()[i]]
-            # Try books_content first, then fallback to original books data
-            book_info = models['books_content'][models['books_content']['title'] == title]
-            if book_info.empty:
-                book_info = models['books'][models['books']['title'] == title]
-                if book_info.empty:
-                    continue
-            
-            book_info = book_info.iloc[0]
-            
-            # Validate image URL
-            img_url = book_info['img_url']
-            if not isinstance(img_url, str) or not img_url.startswith('http'):
-                img_url = "/static/images/no-image.jpg"
-            
+            neighbor_id = int(book_pivot.index[indices.flatten()[i]])
+            book_info = catalogue.get(neighbor_id)
+
             recs.append({
-                'title': title,
+                'book_id': neighbor_id,
+                'title': book_info['title'],
                 'author': book_info['author'],
                 'year': book_info['year'],
                 'publisher': book_info['publisher'],
-                'image_url': img_url,
+                'image_url': validate_image_url(book_info['img_url']),
                 'score': (1 - distances.flatten()[i]),
                 'type': 'collaborative'
             })
-        
+
         return recs[:top_n]
-    
+
     except Exception as e:
         print(f"Error in collaborative recommendations: {e}")
         return []
 
-def content_recommendations(book_title, top_n=9):
+def content_recommendations(book_id, top_n=9):
     """Generate content-based recommendations"""
+    if router is not None:
+        return sharded_recommendations(book_id, ['content'], top_n)['content']
+    if artifact is not None:
+        return artifact_recommendations(book_id, 'content', top_n)
+
     try:
-        if book_title not in models['title_to_idx']:
-            return []
-            
-        cb_idx = models['title_to_idx'][book_title]
-        sim_scores = list(enumerate(models['content_sim_matrix'][cb_idx]))
-        sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
-        sim_scores = sim_scores[1:top_n+1]
-        
-        recs = []
-        for i, score in sim_scores:
-            title = models['books_content']['title'].iloc[i]
-            book_info = models['books_content'][models['books_content']['title'] == title].iloc[0]
-            
-            # Validate image URL
-            img_url = book_info['img_url']
-            if not isinstance(img_url, str) or not img_url.startswith('http'):
-                img_url = "/static/images/no-image.jpg"
-            
-            recs.append({
-                'title': title,
-                'author': book_info['author'],
-                'year': book_info['year'],
-                'publisher': book_info['publisher'],
-                'image_url': img_url,
-                'score': score,
-                'type': 'content'
-            })
-        
-        return recs[:top_n]
-    
+        # The pickled model handles both the TF-IDF and the hashed index modes
+        recs = legacy_model('cb_model').get_recommendations(book_id, catalogue, top_n)
+        for rec in recs:
+            rec['image_url'] = validate_image_url(catalogue.get(rec['book_id'])['img_url'])
+        return recs
+
     except Exception as e:
         print(f"Error in content recommendations: {e}")
         return []
 
-def hybrid_recommendations(book_title, cf_weight=0.6, cb_weight=0.4, top_n=9):
+def hybrid_recommendations(book_id, cf_weight=0.6, cb_weight=0.4, top_n=9):
     """Generate hybrid recommendations"""
+    if router is not None:
+        # The owner shard holds both neighbor lists and merges them itself
+        return sharded_recommendations(book_id, ['hybrid'], top_n)['hybrid']
+    
     try:
         # Get recommendations from both methods
-        cf_recs = collaborative_recommendations(book_title, top_n*2)
-        cb_recs = content_recommendations(book_title, top_n*2)
-        
-        # If no recommendations from either method, return empty
-        if not cf_recs and not cb_recs:
-            return []
+        cf_recs = collaborative_recommendations(book_id, top_n*2)
+        cb_recs = content_recommendations(book_id, top_n*2)
         
         # Combine results from both methods
-        combined_scores = {}
-        
-        # Add CF recommendations with weighted scores
-        for rec in cf_recs:
-            combined_scores[rec['title']] = {
-                'data': rec,
-                'score': rec['score'] * cf_weight
-            }
-        
-        # Add CB recommendations with weighted scores
-        for rec in cb_recs:
-            if rec['title'] in combined_scores:
-                combined_scores[rec['title']]['score'] += rec['score'] * cb_weight
-            else:
-                combined_scores[rec['title']] = {
-                    'data': rec,
-                    'score': rec['score'] * cb_weight
-                }
-        
-        # Sort by combined score
-        sorted_recs = sorted(combined_scores.values(), key=lambda x: x['score'], reverse=True)
-        
-        # Prepare final recommendations
-        final_recs = []
-        for rec in sorted_recs[:top_n]:
-            final_rec = rec['data'].copy()
-            final_rec['score'] = rec['score']
-            final_rec['type'] = 'hybrid'
-            final_recs.append(final_rec)
-        
-        return final_recs
+        return HybridRecommendationModel.combine(cf_recs, cb_recs, cf_weight, cb_weight, top_n)
     
     except Exception as e:
         print(f"Error in hybrid recommendations: {e}")
         return []
 
+def all_recommendations(book_id, top_n=9):
+    """Generate the results of all three methods from one lookup per branch"""
+    if router is not None:
+        return sharded_recommendations(book_id, ['collaborative', 'content', 'hybrid'], top_n)
+    
+    cf_recs = collaborative_recommendations(book_id, top_n*2)
+    cb_recs = content_recommendations(book_id, top_n*2)
+    return {
+        'collaborative': cf_recs[:top_n],
+        'content': cb_recs[:top_n],
+        'hybrid': HybridRecommendationModel.combine(cf_recs, cb_recs, top_n=top_n)
+    }
+
+def batch_recommendations(book_ids, method, top_n=9):
+    """Generate recommendations for several books; with shards, in one fan-out per lookup stage"""
+    if router is not None:
+        try:
+            results = router.batch(book_ids, [method], top_n)[method]
+        except ShardUnavailable as e:
+            print(f"Error in sharded batch recommendations: {e}")
+            return {book_id: [] for book_id in book_ids}
+        return {book_id: [shard_recommendation(book_info, method) for book_info in results[book_id]]
+                for book_id in book_ids}
+    
+    return {book_id: RECOMMENDERS[method](book_id, top_n=top_n) for book_id in book_ids}
+
+def legacy_model_version():
+    """Version the pickled models by file size and modification time"""
+    digest = hashlib.sha1()
+    for filename in sorted(MODEL_FILES.values()):
+        file_path = os.path.join(MODELS_DIR, filename)
+        if os.path.exists(file_path):
+            stat = os.stat(file_path)
+            digest.update(f"{filename}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()[:16]
+
+# Every response depends only on its inputs and this version
+if router is not None:
+    MODEL_VERSION = router.model_version
+elif artifact is not None:
+    MODEL_VERSION = artifact.model_version
+else:
+    MODEL_VERSION = legacy_model_version()
+
+def popularity_seed():
+    """Training rating counts per served book, as (book_ids, counts)"""
+    if router is not None:
+        book_ids, _, num_ratings = router.titles()
+        return book_ids, num_ratings
+    if artifact is not None:
+        return artifact.book_ids, artifact.arrays['num_ratings']
+    counts = legacy_model('final_rating').groupby('book_id')['rating'].count()
+    return counts.index.to_numpy(), counts.to_numpy()
+
+# Popular and trending books follow the rating event log; the training counts are only a seed
+popularity = PopularityTracker.open(popularity_seed, MODEL_VERSION,
+                                    num_books=len(catalogue) if catalogue is not None else None)
+
+def book_details(book_ids):
+    """Return the metadata of the given books, in order"""
+    if catalogue is not None:
+        return [catalogue.get(book_id) for book_id in book_ids if book_id in catalogue]
+    if router is not None:
+        try:
+            found = router.books(book_ids)
+        except ShardUnavailable as e:
+            print(f"Error loading book details: {e}")
+            return []
+        return [found[book_id] for book_id in book_ids if book_id in found]
+    rows = [artifact.row_of(book_id) for book_id in book_ids]
+    return [artifact.book_info(row) for row in rows if row is not None]
+
+def cached_response(body, etag, mimetype='application/json', status=200):
+    """Build a response with a validator, cache headers and gzip when the client accepts it"""
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    body, encoding = compress(body, request.headers.get('Accept-Encoding'))
+
+    response = Response(body, status=status, mimetype=mimetype)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    if request.method in ('GET', 'HEAD'):
+        response.headers['Cache-Control'] = f'public, max-age={Config.HTTP_CACHE_MAX_AGE}'
+        response.set_etag(etag, weak=True)
+    else:
+        # Form POSTs must not be stored by shared caches
+        response.headers['Cache-Control'] = 'no-store'
+    return response
+
+def not_modified(etag):
+    """Return a 304 response if the client already holds this version, otherwise None"""
+    if request.method in ('GET', 'HEAD') and request.if_none_match.contains_weak(etag):
+        return cached_response(b'', etag, status=304)
+    return None
+
+def server_busy(as_json=False):
+    """Fast 503 for when too many recommendation requests are pending"""
+    message = "The server is busy, please try again shortly."
+    body = jsonify({'error': message}) if as_json else message
+    return body, 503, {'Retry-After': str(Config.SERVING_RETRY_AFTER)}
+
 @app.route('/')
 def home():
     # Get the search term from the query parameters if it exists
     search_term = request.args.get('search_term', '')
+    popularity.refresh()
+    etag = make_etag(MODEL_VERSION, popularity.version, request.path, search_term)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
     
-    # Get some popular books for the homepage
-    popular_books = models['final_rating'].groupby('title')['rating'].count().sort_values(ascending=False).head(12).index.tolist()
-    books_data = []
+    # Get popular and trending books for the homepage
+    popular_books = book_details([book_id for book_id, _ in popularity.popular(12)])
+    trending_books = book_details([book_id for book_id, _ in popularity.trending(4)])
     
-    for title in popular_books:
-        book_info = models['books_content'][models['books_content']['title'] == title]
-        if book_info.empty:
-            book_info = models['books'][models['books']['title'] == title]
-            if book_info.empty:
-                continue
-        
-        book_info = book_info.iloc[0]
-        img_url = book_info['img_url'] if isinstance(book_info['img_url'], str) and book_info['img_url'].startswith('http') else "/static/images/no-image.jpg"
-        
-        books_data.append({
-            'title': title,
+    def card(book_info):
+        return {
+            'title': book_info['title'],
             'author': book_info['author'],
-            'image_url': img_url
-        })
+            'image_url': validate_image_url(book_info['img_url'])
+        }
     
-    return render_template('index.html', popular_books=books_data, search_term=search_term)
+    html = render_template('index.html',
+                           popular_books=[card(book_info) for book_info in popular_books],
+                           trending_books=[card(book_info) for book_info in trending_books],
+                           search_term=search_term)
+    return cached_response(html, etag, mimetype='text/html')
+
+RECOMMENDERS = {
+    'hybrid': hybrid_recommendations,
+    'collaborative': collaborative_recommendations,
+    'content': content_recommendations
+}
+
+# Identical concurrent requests share one computation on a bounded pool
+coalescer = RequestCoalescer()
+
+async def find_recommendations(query, method, top_n):
+    """Resolve a query and return (book_id, book_title, recommendations)
 
-@app.route('/recommend', methods=['POST'])
-def recommend():
-    book_title = request.form['book_title']
-    method = request.form.get('method', 'hybrid')
+    Raises ServerOverloaded when the recommendation pool is full.
+    """
+    resolved = resolve_book(query)
+    if resolved is None:
+        return None, query, []
     
-    if method == 'hybrid':
-        recommendations = hybrid_recommendations(book_title)
-    elif method == 'collaborative':
-        recommendations = collaborative_recommendations(book_title)
-    elif method == 'content':
-        recommendations = content_recommendations(book_title)
-    else:
-        recommendations = []
+    book_id, book_title = resolved
+    if method not in RECOMMENDERS:
+        return book_id, book_title, []
+    
+    recommendations = await coalescer.run((book_id, method, top_n), RECOMMENDERS[method],
+                                          book_id, top_n=top_n)
+    return book_id, book_title, recommendations
+
+@app.route('/recommend', methods=['GET', 'POST'])
+async def recommend():
+    query = request.values.get('book_title', '')
+    method = request.values.get('method', 'hybrid')
+    top_n = 9
+    etag = make_etag(MODEL_VERSION, request.path, query, method, top_n)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    
+    try:
+        _, book_title, recommendations = await find_recommendations(query, method, top_n)
+    except ServerOverloaded:
+        return server_busy()
     
-    return render_template('recommendations.html', 
-                         recommendations=recommendations,
-                         book_title=book_title,
-                         method=method)
+    html = render_template('recommendations.html', 
+                           recommendations=recommendations,
+                           book_title=book_title,
+                           query=query,
+                           method=method)
+    return cached_response(html, etag, mimetype='text/html')
+
+@app.route('/api/recommendations', methods=['GET'])
+async def api_recommendations():
+    """Recommendations as JSON for programmatic clients"""
+    query = request.args.get('book_title', '')
+    method = request.args.get('method', 'hybrid')
+    if method not in RECOMMENDERS:
+        return jsonify({'error': f"Unknown method: {method}"}), 400
+    top_n = min(max(request.args.get('top_n', 9, type=int), 1), Config.SERVING_NEIGHBORS)
+    
+    etag = make_etag(MODEL_VERSION, request.path, query, method, top_n)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    
+    try:
+        book_id, book_title, recommendations = await find_recommendations(query, method, top_n)
+    except ServerOverloaded:
+        return server_busy(as_json=True)
+    
+    if book_id is None:
+        payload = {'error': "Book not found", 'query': query}
+        return cached_response(encode_json(payload), etag, status=404)
+    
+    payload = {
+        'query': query,
+        'book_id': book_id,
+        'book_title': book_title,
+        'method': method,
+        'model_version': MODEL_VERSION,
+        'recommendations': recommendations
+    }
+    return cached_response(encode_json(payload), etag)
+
+@app.route('/api/recommendations/all', methods=['GET'])
+async def api_all_recommendations():
+    """Results of all three methods as JSON, sharing the candidate lookups"""
+    query = request.args.get('book_title', '')
+    top_n = min(max(request.args.get('top_n', 9, type=int), 1), Config.SERVING_NEIGHBORS)
+    
+    etag = make_etag(MODEL_VERSION, request.path, query, top_n)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    
+    resolved = resolve_book(query)
+    if resolved is None:
+        payload = {'error': "Book not found", 'query': query}
+        return cached_response(encode_json(payload), etag, status=404)
+    
+    book_id, book_title = resolved
+    try:
+        recommendations = await coalescer.run((book_id, 'all', top_n), all_recommendations, book_id, top_n=top_n)
+    except ServerOverloaded:
+        return server_busy(as_json=True)
+    
+    payload = {
+        'query': query,
+        'book_id': book_id,
+        'book_title': book_title,
+        'model_version': MODEL_VERSION,
+        'recommendations': recommendations
+    }
+    return cached_response(encode_json(payload), etag)
+
+@app.route('/api/recommendations/batch', methods=['GET'])
+async def api_batch_recommendations():
+    """Recommendations for several titles (repeated book_title parameters) as JSON"""
+    queries = request.args.getlist('book_title')[:Config.BATCH_MAX_TITLES]
+    method = request.args.get('method', 'hybrid')
+    if method not in RECOMMENDERS:
+        return jsonify({'error': f"Unknown method: {method}"}), 400
+    top_n = min(max(request.args.get('top_n', 9, type=int), 1), Config.SERVING_NEIGHBORS)
+    
+    etag = make_etag(MODEL_VERSION, request.path, method, top_n, *queries)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    
+    resolved = [resolve_book(query) for query in queries]
+    book_ids = sorted({found[0] for found in resolved if found is not None})
+    try:
+        recommendations = await coalescer.run(('batch', tuple(book_ids), method, top_n), batch_recommendations,
+                                              book_ids, method, top_n=top_n)
+    except ServerOverloaded:
+        return server_busy(as_json=True)
+    
+    results = []
+    for query, found in zip(queries, resolved):
+        if found is None:
+            results.append({'query': query, 'error': "Book not found"})
+        else:
+            results.append({
+                'query': query,
+                'book_id': found[0],
+                'book_title': found[1],
+                'recommendations': recommendations[found[0]]
+            })
+    
+    payload = {
+        'method': method,
+        'model_version': MODEL_VERSION,
+        'results': results
+    }
+    return cached_response(encode_json(payload), etag)
+
+@app.route('/api/popular', methods=['GET'])
+def api_popular():
+    """Popular or trending books with their decayed rating counts as JSON"""
+    kind = request.args.get('kind', 'popular')
+    if kind not in PopularityTracker.HALF_LIVES:
+        return jsonify({'error': f"Unknown kind: {kind}"}), 400
+    limit = min(max(request.args.get('limit', 12, type=int), 1), Config.POPULARITY_TOP_K)
+
+    popularity.refresh()
+    etag = make_etag(MODEL_VERSION, popularity.version, request.path, kind, limit)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+
+    top = popularity.top(kind, limit)
+    details = {book_info['book_id']: book_info for book_info in book_details([book_id for book_id, _ in top])}
+
+    books = []
+    for book_id, count in top:
+        if book_id not in details:
+            continue
+        books.append({
+            'book_id': book_id,
+            'title': details[book_id]['title'],
+            'author': details[book_id]['author'],
+            'image_url': validate_image_url(details[book_id]['img_url']),
+            'count': round(count, 3)
+        })
+
+    payload = {'kind': kind, 'model_version': MODEL_VERSION, 'books': books}
+    return cached_response(encode_json(payload), etag)
 
 @app.route('/search_books', methods=['GET'])
 def search_books():
@@ -221,22 +546,60 @@ def search_books():
     if not query:
         return jsonify([])
     
-    # Search in books_content first, then fallback to books
-    matching_books = models['books_content'][models['books_content']['title'].str.lower().str.contains(query)]
-    if len(matching_books) < 5:
-        additional_matches = models['books'][models['books']['title'].str.lower().str.contains(query)]
-        matching_books = pd.concat([matching_books, additional_matches]).drop_duplicates('title')
+    etag = make_etag(MODEL_VERSION, request.path, query)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
     
     results = []
-    for _, row in matching_books.head(9).iterrows():
-        img_url = row['img_url'] if isinstance(row['img_url'], str) and row['img_url'].startswith('http') else "/static/images/no-image.jpg"
-        results.append({
-            'title': row['title'],
-            'author': row['author'],
-            'image_url': img_url
-        })
+    if router is not None:
+        try:
+            matches = router.search_titles(query, 9)
+        except ShardUnavailable as e:
+            print(f"Error searching shards: {e}")
+            matches = []
+        for book_info in matches:
+            results.append({
+                'title': book_info['title'],
+                'author': book_info['author'],
+                'image_url': validate_image_url(book_info['img_url'])
+            })
+    elif artifact is not None:
+        # Trained books first: these can be recommended from
+        for row in artifact.search_titles(query, 9):
+            book_info = artifact.book_info(row)
+            results.append({
+                'title': book_info['title'],
+                'author': book_info['author'],
+                'image_url': validate_image_url(book_info['img_url'])
+            })
+    else:
+        books_content = legacy_model('books_content')
+        matching_books = books_content[books_content['title'].str.lower().str.contains(query, regex=False)]
+        for _, row in matching_books.head(9).iterrows():
+            results.append({
+                'title': row['title'],
+                'author': row['author'],
+                'image_url': validate_image_url(row['img_url'])
+            })
+    
+    # Fill up from the full catalogue for titles outside the trained set
+    if catalogue is not None and len(results) < 5:
+        seen = {result['title'] for result in results}
+        for book_id in catalogue.search(query, 9 + len(seen)):
+            if len(results) >= 9:
+                break
+            book_info = catalogue.get(book_id)
+            if book_info['title'] in seen:
+                continue
+            seen.add(book_info['title'])
+            results.append({
+                'title': book_info['title'],
+                'author': book_info['author'],
+                'image_url': validate_image_url(book_info['img_url'])
+            })
     
-    return jsonify(results)
+    return cached_response(encode_json(results), etag)
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
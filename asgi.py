@@ -0,0 +1,28 @@
+"""ASGI entry point for the web app: uvicorn asgi:asgi_app"""
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+
+from app import app
+from config import Config
+
+# asgiref runs wrapped WSGI apps thread-sensitively, all on one thread, which
+# would serialize requests and keep identical ones from ever coalescing
+executor = ThreadPoolExecutor(max_workers=Config.SERVER_THREADS, thread_name_prefix='asgi')
+
+
+class ThreadedWsgiToAsgiInstance(WsgiToAsgiInstance):
+    """Run each request's WSGI call on the shared request thread pool"""
+
+    async def run_wsgi_app(self, body):
+        run = WsgiToAsgiInstance.__dict__['run_wsgi_app'].func
+        await sync_to_async(run, thread_sensitive=False, executor=executor)(self, body)
+
+
+class ThreadedWsgiToAsgi(WsgiToAsgi):
+    async def __call__(self, scope, receive, send):
+        await ThreadedWsgiToAsgiInstance(self.wsgi_application, self.duplicate_header_limit)(scope, receive, send)
+
+
+asgi_app = ThreadedWsgiToAsgi(app)
@@ -0,0 +1,107 @@
+"""Measure serving cold start: time and memory to import the Flask app.
+
+Compares loading the lean serving artifact (what app.py does when
+serving_artifact.npz exists) with unpickling the full sklearn/pandas
+models the way the app used to at startup.
+
+Usage:
+    python benchmarks/bench_cold_start.py [--models-dir DIR] [--runs N]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Each probe runs in a fresh interpreter and prints one JSON line
+ARTIFACT_PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {base_dir!r})
+import app
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    'seconds': elapsed,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'modules': len(sys.modules),
+    'artifact_loaded': app.artifact is not None,
+    'heavy_imported': sorted(m for m in ('pandas', 'sklearn', 'scipy') if m in sys.modules)
+}}))
+"""
+
+LEGACY_PROBE = """
+import json, os, pickle, resource, sys, time
+start = time.perf_counter()
+sys.path.insert(0, os.path.join({base_dir!r}, 'main'))
+import flask
+import numpy, pandas, scipy.sparse, sklearn.neighbors, sklearn.feature_extraction.text, sklearn.metrics.pairwise
+from catalogue_store import CatalogueStore
+for name in ('cf_model.pkl', 'book_pivot.pkl', 'tfidf_vectorizer.pkl', 'content_sim_matrix.pkl',
+             'id_to_idx.pkl', 'books_content.pkl', 'final_rating.pkl'):
+    path = os.path.join({models_dir!r}, name)
+    # Hashed content models are saved without the separate TF-IDF files
+    if name in ('tfidf_vectorizer.pkl', 'content_sim_matrix.pkl', 'id_to_idx.pkl') and not os.path.exists(path):
+        continue
+    with open(path, 'rb') as f:
+        pickle.load(f)
+if CatalogueStore.open(os.path.join({models_dir!r}, CatalogueStore.DIRNAME)) is None:
+    raise FileNotFoundError('catalogue/meta.json')
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    'seconds': elapsed,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'modules': len(sys.modules),
+    'artifact_loaded': False,
+    'heavy_imported': sorted(m for m in ('pandas', 'sklearn', 'scipy') if m in sys.modules)
+}}))
+"""
+
+
+def run_probe(code, models_dir, runs):
+    """Run a probe several times in fresh interpreters and collect the results"""
+    env = dict(os.environ, BOOKSAGE_MODELS_DIR=models_dir)
+    results = []
+    for _ in range(runs):
+        completed = subprocess.run([sys.executable, '-c', code], env=env, cwd=BASE_DIR,
+                                   capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(completed.stderr.strip().splitlines()[-1] if completed.stderr else 'probe failed')
+            return None
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    return results
+
+
+def summarize(name, results):
+    if not results:
+        print(f"{name:<10} unavailable")
+        return
+    seconds = [r['seconds'] for r in results]
+    rss = [r['max_rss_mb'] for r in results]
+    print(f"{name:<10}{statistics.median(seconds):>10.3f}{max(seconds):>10.3f}"
+          f"{statistics.median(rss):>12.1f}{results[0]['modules']:>10}"
+          f"   {', '.join(results[0]['heavy_imported']) or '-'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--models-dir', default=os.path.join(BASE_DIR, 'models'))
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    models_dir = os.path.abspath(args.models_dir)
+    artifact = run_probe(ARTIFACT_PROBE.format(base_dir=BASE_DIR), models_dir, args.runs)
+    legacy = run_probe(LEGACY_PROBE.format(base_dir=BASE_DIR, models_dir=models_dir), models_dir, args.runs)
+
+    print(f"Cold start over {args.runs} runs ({models_dir})")
+    print(f"{'mode':<10}{'median s':>10}{'max s':>10}{'max RSS MB':>12}{'modules':>10}   heavy modules")
+    summarize('artifact', artifact)
+    summarize('legacy', legacy)
+    if artifact and not artifact[0]['artifact_loaded']:
+        print("Warning: serving artifact not found, app.py fell back to the pickled models")
+
+
+if __name__ == '__main__':
+    main()
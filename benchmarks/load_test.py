@@ -0,0 +1,425 @@
+"""Load-test the web app: replay a request log or a synthetic mix at a target rate.
+
+Each target is started as a local server process (or given as a URL),
+driven by concurrent clients on an open-loop schedule, and reported with
+throughput, latency percentiles, error rates and per-worker RSS. Several
+targets get the same request stream, so model versions or server
+configurations can be compared side by side.
+
+The synthetic mix draws titles from a Zipf distribution over the served
+books, ordered by popularity: homepage views, /search_books keystroke
+sequences while a title is typed, and /recommend across the three methods.
+A log file holds one request per line, either "GET /path?query" or
+"POST /path form=body", or access-log lines containing "GET /path HTTP/1.1".
+
+Usage:
+    python benchmarks/load_test.py --target current
+    python benchmarks/load_test.py --target old:models=/srv/models-v1 \\
+        --target new:models=/srv/models-v2,workers=4 --rate 50 --duration 60
+    python benchmarks/load_test.py --target prod:url=http://127.0.0.1:8000 --log access.log
+
+Target options (comma separated after NAME:): models, server (gunicorn,
+uvicorn or flask), workers, threads, url.
+"""
+import argparse
+import http.client
+import os
+import queue
+import random
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, 'main'))
+
+from config import Config
+
+METHODS = ('hybrid', 'collaborative', 'content')
+LOG_LINE = re.compile(r'\b(GET|POST|HEAD) (/\S*)(?: HTTP/[\d.]+| (\S+))?')
+
+
+def load_titles(models_dir):
+    """Return served titles, most popular first"""
+    from serving_artifact import ServingArtifact
+    from catalogue_store import CatalogueStore
+
+    artifact_path = os.path.join(models_dir, ServingArtifact.FILENAME)
+    if os.path.exists(artifact_path):
+        artifact = ServingArtifact.load(artifact_path)
+        return [str(artifact.titles[row]) for row in artifact.popular(len(artifact.titles))]
+
+    catalogue = CatalogueStore.open(os.path.join(models_dir, CatalogueStore.DIRNAME))
+    if catalogue is None:
+        return []
+    return [catalogue.title(book_id) for book_id in range(len(catalogue))]
+
+
+def synthetic_requests(titles, count, zipf_s, seed):
+    """Generate (method, path, body, label) requests from a Zipf-distributed title mix"""
+    rng = random.Random(seed)
+    weights = [1.0 / (rank ** zipf_s) for rank in range(1, len(titles) + 1)]
+    requests = []
+    while len(requests) < count:
+        kind = rng.random()
+        if kind < 0.1 or not titles:
+            requests.append(('GET', '/', None, '/'))
+            continue
+
+        title = rng.choices(titles, weights)[0]
+        if kind < 0.5:
+            # Keystrokes while typing the title into the search box
+            typed = rng.randint(3, max(3, min(len(title), 12)))
+            for length in range(3, typed + 1):
+                query = urllib.parse.urlencode({'query': title[:length]})
+                requests.append(('GET', f'/search_books?{query}', None, '/search_books'))
+        else:
+            method = rng.choice(METHODS)
+            body = urllib.parse.urlencode({'book_title': title, 'method': method})
+            requests.append(('POST', '/recommend', body, f'/recommend:{method}'))
+    return requests[:count]
+
+
+def label_of(method, path, body):
+    """Group requests by endpoint, and by method for /recommend"""
+    parsed = urllib.parse.urlsplit(path)
+    if parsed.path in ('/recommend', '/api/recommendations'):
+        params = urllib.parse.parse_qs(body or parsed.query)
+        return f"{parsed.path}:{params.get('method', ['hybrid'])[0]}"
+    return parsed.path
+
+
+def logged_requests(log_path):
+    """Read (method, path, body, label) requests from a log file"""
+    requests = []
+    with open(log_path) as f:
+        for line in f:
+            match = LOG_LINE.search(line)
+            if not match:
+                continue
+            method, path, body = match.groups()
+            body = body if method == 'POST' else None
+            requests.append((method, path, body, label_of(method, path, body)))
+    return requests
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def server_command(options, port):
+    server = options.get('server', 'gunicorn')
+    workers = options.get('workers', '2')
+    if server == 'gunicorn':
+        return [sys.executable, '-m', 'gunicorn', 'app:app', '-b', f'127.0.0.1:{port}',
+                '-w', workers, '-k', 'gthread', '--threads', options.get('threads', str(Config.SERVER_THREADS))]
+    if server == 'uvicorn':
+        return [sys.executable, '-m', 'uvicorn', 'asgi:asgi_app', '--port', str(port),
+                '--workers', workers, '--log-level', 'warning']
+    if server == 'flask':
+        return [sys.executable, '-c', f"import app; app.app.run(port={port}, threaded=True)"]
+    raise ValueError(f"Unknown server: {server}")
+
+
+def wait_until_ready(host, port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection(host, port, timeout=5)
+            connection.request('GET', '/')
+            status = connection.getresponse().status
+            connection.close()
+            if status < 500:
+                return True
+        except OSError:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def process_tree(pid):
+    """Return the pid and all descendant pids of a process (Linux /proc)"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                parent = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(int(entry))
+
+    pids, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        pids.append(current)
+        stack.extend(children.get(current, []))
+    return pids
+
+
+def rss_mb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class RssSampler(threading.Thread):
+    """Track the peak RSS of every process of a server while it is under load"""
+
+    def __init__(self, pid, interval=0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = {}
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            for pid in process_tree(self.pid):
+                rss = rss_mb(pid)
+                if rss is not None:
+                    self.peak[pid] = max(self.peak.get(pid, 0.0), rss)
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def drive(host, port, requests, rate, clients):
+    """Send requests on an open-loop schedule and return (results, duration)"""
+    schedule = queue.Queue()
+    start = time.perf_counter() + 0.1
+    for i, request in enumerate(requests):
+        schedule.put((start + i / rate, request))
+
+    results = []
+    lock = threading.Lock()
+
+    def client():
+        connection = None
+        while True:
+            try:
+                due, (method, path, body, label) = schedule.get_nowait()
+            except queue.Empty:
+                break
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+            sent = time.perf_counter()
+            headers = {'Accept-Encoding': 'gzip'}
+            if body is not None:
+                headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            try:
+                if connection is None:
+                    connection = http.client.HTTPConnection(host, port, timeout=30)
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+                if response.getheader('Connection', '').lower() == 'close':
+                    connection.close()
+                    connection = None
+            except (OSError, http.client.HTTPException):
+                status = None
+                if connection is not None:
+                    connection.close()
+                connection = None
+            done = time.perf_counter()
+            with lock:
+                # Latency counts from the scheduled time, so waiting for a free client
+                # is not hidden (coordinated omission); service time counts from sending
+                results.append((label, status, done - due, done - sent))
+
+        if connection is not None:
+            connection.close()
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - start
+
+
+def percentile(values, q):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def summarize(results, duration, peak_rss):
+    latencies = [latency * 1000 for _, _, latency, _ in results]
+    service_times = [service * 1000 for _, _, _, service in results]
+    errors = sum(1 for _, status, _, _ in results if status is None or status >= 400)
+    summary = {
+        'requests': len(results),
+        'throughput_rps': len(results) / duration if duration > 0 else 0.0,
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'service_p95_ms': percentile(service_times, 95),
+        'service_p99_ms': percentile(service_times, 99),
+        'error_rate': errors / max(len(results), 1),
+        'rejected_503': sum(1 for _, status, _, _ in results if status == 503),
+        'max_lag_ms': max(((latency - service) * 1000 for _, _, latency, service in results), default=0.0),
+        'worker_rss_mb': sorted(peak_rss.values(), reverse=True),
+        'endpoints': {}
+    }
+    for label in sorted({label for label, _, _, _ in results}):
+        rows = [r for r in results if r[0] == label]
+        label_latencies = [latency * 1000 for _, _, latency, _ in rows]
+        summary['endpoints'][label] = {
+            'requests': len(rows),
+            'p50_ms': percentile(label_latencies, 50),
+            'p95_ms': percentile(label_latencies, 95),
+            'p99_ms': percentile(label_latencies, 99),
+            'error_rate': sum(1 for _, status, _, _ in rows if status is None or status >= 400) / len(rows)
+        }
+    return summary
+
+
+def parse_target(spec):
+    """Parse NAME[:key=value,...] into (name, options)"""
+    name, _, rest = spec.partition(':')
+    options = {}
+    for item in filter(None, rest.split(',')):
+        key, _, value = item.partition('=')
+        options[key.strip()] = value.strip()
+    return name, options
+
+
+def run_target(name, options, requests, args):
+    """Start (or connect to) one target, load it and return its summary"""
+    process, sampler = None, None
+    if 'url' in options:
+        parsed = urllib.parse.urlsplit(options['url'])
+        host, port = parsed.hostname, parsed.port or 80
+    else:
+        host, port = '127.0.0.1', free_port()
+        models_dir = os.path.abspath(options.get('models', os.path.join(BASE_DIR, 'models')))
+        env = dict(os.environ, BOOKSAGE_MODELS_DIR=models_dir)
+        process = subprocess.Popen(server_command(options, port), cwd=BASE_DIR, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    try:
+        if not wait_until_ready(host, port):
+            print(f"{name}: server did not become ready")
+            return None
+        if process is not None:
+            sampler = RssSampler(process.pid)
+            sampler.start()
+
+        if args.warmup:
+            drive(host, port, requests[:args.warmup], args.rate * 4, args.clients)
+        print(f"{name}: {len(requests)} requests at {args.rate:g}/s with {args.clients} clients...")
+        results, duration = drive(host, port, requests, args.rate, args.clients)
+    finally:
+        if sampler is not None:
+            sampler.stop()
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    peak_rss = dict(sampler.peak) if sampler is not None else {}
+    if process is not None and len(peak_rss) > 1:
+        # The master/reloader process does not serve requests
+        peak_rss.pop(process.pid, None)
+    return summarize(results, duration, peak_rss)
+
+
+def print_report(summaries):
+    """Display the targets side by side"""
+    names = list(summaries)
+    width = max([14] + [len(name) + 2 for name in names])
+    labels = sorted({label for summary in summaries.values() for label in summary['endpoints']})
+    first = max([24] + [len(label) + 10 for label in labels])
+    print("-" * (first + width * len(names)))
+    print(f"{'':<{first}}" + ''.join(f"{name:>{width}}" for name in names))
+    rows = [
+        ('requests', 'requests', '{:.0f}'),
+        ('throughput req/s', 'throughput_rps', '{:.1f}'),
+        ('p50 ms', 'p50_ms', '{:.1f}'),
+        ('p95 ms', 'p95_ms', '{:.1f}'),
+        ('p99 ms', 'p99_ms', '{:.1f}'),
+        ('service p95 ms', 'service_p95_ms', '{:.1f}'),
+        ('service p99 ms', 'service_p99_ms', '{:.1f}'),
+        ('error rate', 'error_rate', '{:.2%}'),
+        ('503 responses', 'rejected_503', '{:.0f}'),
+        ('max schedule lag ms', 'max_lag_ms', '{:.0f}'),
+    ]
+    for title, key, fmt in rows:
+        print(f"{title:<{first}}" + ''.join(f"{fmt.format(summaries[name][key]):>{width}}" for name in names))
+
+    def rss_cell(summary):
+        rss = summary['worker_rss_mb']
+        if not rss:
+            return '-'
+        return f"{len(rss)}x {statistics.mean(rss):.0f}" if len(rss) > 1 else f"{rss[0]:.0f}"
+
+    print(f"{'worker RSS MB':<{first}}" + ''.join(f"{rss_cell(summaries[name]):>{width}}" for name in names))
+
+    for label in labels:
+        cells = []
+        for name in names:
+            endpoint = summaries[name]['endpoints'].get(label)
+            cells.append('-' if endpoint is None else f"{endpoint['p50_ms']:.1f}/{endpoint['p99_ms']:.1f}")
+        print(f"{label + ' p50/p99':<{first}}" + ''.join(f"{cell:>{width}}" for cell in cells))
+    print("-" * (first + width * len(names)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', action='append', default=[],
+                        help="NAME[:models=DIR,server=gunicorn,workers=2,threads=8,url=URL]; repeat to compare")
+    parser.add_argument('--log', help="replay requests from this log instead of the synthetic mix")
+    parser.add_argument('--rate', type=float, default=20.0, help="target requests per second")
+    parser.add_argument('--duration', type=float, default=30.0, help="seconds of synthetic load")
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--warmup', type=int, default=50, help="requests sent before measuring")
+    parser.add_argument('--zipf', type=float, default=1.1, help="Zipf exponent of title popularity")
+    parser.add_argument('--seed', type=int, default=Config.EVAL_RANDOM_STATE)
+    args = parser.parse_args()
+
+    targets = [parse_target(spec) for spec in (args.target or ['current'])]
+
+    if args.log:
+        requests = logged_requests(args.log)
+    else:
+        # Titles come from the first target's models so every target sees the same stream
+        models_dir = targets[0][1].get('models', os.path.join(BASE_DIR, 'models'))
+        titles = load_titles(os.path.abspath(models_dir))
+        requests = synthetic_requests(titles, int(args.rate * args.duration), args.zipf, args.seed)
+    if not requests:
+        print("No requests to send")
+        return
+
+    summaries = {}
+    for name, options in targets:
+        summary = run_target(name, options, requests, args)
+        if summary is not None:
+            summaries[name] = summary
+    if summaries:
+        print_report(summaries)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+import hashlib
+import json
+import mmap
+import os
+import numpy as np
+from title_resolver import normalize_title, main_title
+
+
+def _write_string_table(directory, name, values):
+    """Write strings as one UTF-8 arena plus an offsets array"""
+    encoded = [value.encode('utf-8') for value in values]
+    lengths = np.fromiter((len(value) for value in encoded), dtype=np.int64, count=len(encoded))
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    offset_dtype = np.uint32 if offsets[-1] < np.iinfo(np.uint32).max else np.uint64
+
+    with open(os.path.join(directory, f'{name}.bin'), 'wb') as f:
+        f.write(b''.join(encoded))
+    np.save(os.path.join(directory, f'{name}_offsets.npy'), offsets.astype(offset_dtype))
+
+
+def _as_text(value):
+    if not isinstance(value, str):
+        return ''
+    return value.replace('\n', ' ')
+
+
+def _as_year(value):
+    text = str(value).strip()
+    if not text.isdigit():
+        return 0
+    return min(int(text), np.iinfo(np.int16).max)
+
+
+def _key_hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _title_key_tables(titles):
+    """Sorted 64-bit hashes of normalized full and main titles, each with the book ids they belong to"""
+    tables = {}
+    for name, key_of in (('title_keys', normalize_title),
+                         ('main_title_keys', lambda title: normalize_title(main_title(title)))):
+        hashes = np.fromiter((_key_hash(key_of(title)) for title in titles), dtype=np.uint64, count=len(titles))
+        # Stable, so books sharing a key stay in book id order
+        order = np.argsort(hashes, kind='stable')
+        tables[name] = hashes[order]
+        tables[f'{name}_ids'] = order.astype(np.int32)
+    return tables
+
+
+class _StringTable:
+    """Read-only view of a string table; strings are decoded on access"""
+
+    def __init__(self, directory, name):
+        self.offsets = np.load(os.path.join(directory, f'{name}_offsets.npy'), mmap_mode='r')
+        path = os.path.join(directory, f'{name}.bin')
+        self._file = open(path, 'rb')
+        if os.path.getsize(path) > 0:
+            self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.data = b''
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        start, end = int(self.offsets[index]), int(self.offsets[index + 1])
+        return self.data[start:end].decode('utf-8')
+
+    def row_at(self, position):
+        """Return the index of the string containing a byte position"""
+        return int(np.searchsorted(self.offsets, position, side='right')) - 1
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self._file.close()
+
+
+class CatalogueStore:
+    """Compact, memory-mapped book catalogue indexed by book id
+
+    Per-book strings (ISBN, title, image URL) live in UTF-8 arenas,
+    author and publisher are dictionary-encoded and the year is an int16.
+    Everything is memory-mapped, so rows are only paged in when read.
+    """
+
+    DIRNAME = 'catalogue'
+    KEY_TABLES = ('title_keys', 'title_keys_ids', 'main_title_keys', 'main_title_keys_ids')
+
+    def __init__(self, directory):
+        self.directory = str(directory)
+        with open(os.path.join(self.directory, 'meta.json')) as f:
+            self.meta = json.load(f)
+
+        self.isbns = _StringTable(self.directory, 'isbns')
+        self.titles = _StringTable(self.directory, 'titles')
+        self.img_urls = _StringTable(self.directory, 'img_urls')
+        self.search_titles = _StringTable(self.directory, 'search_titles')
+        self.author_names = _StringTable(self.directory, 'author_names')
+        self.publisher_names = _StringTable(self.directory, 'publisher_names')
+        self.author_codes = np.load(os.path.join(self.directory, 'author_codes.npy'), mmap_mode='r')
+        self.publisher_codes = np.load(os.path.join(self.directory, 'publisher_codes.npy'), mmap_mode='r')
+        self.years = np.load(os.path.join(self.directory, 'years.npy'), mmap_mode='r')
+        self._key_tables = None
+        if os.path.exists(os.path.join(self.directory, 'title_keys.npy')):
+            self._key_tables = {name: np.load(os.path.join(self.directory, f'{name}.npy'), mmap_mode='r')
+                                for name in self.KEY_TABLES}
+
+    @staticmethod
+    def build(books, directory):
+        """Write the catalogue from a books frame whose book_id is the row position"""
+        directory = str(directory)
+        os.makedirs(directory, exist_ok=True)
+
+        if not (books['book_id'].to_numpy() == np.arange(len(books))).all():
+            raise ValueError("book_id must equal the row position of the books frame")
+
+        titles = [_as_text(value) for value in books['title'].tolist()]
+        _write_string_table(directory, 'isbns', [_as_text(value) for value in books['ISBN'].tolist()])
+        _write_string_table(directory, 'titles', titles)
+        _write_string_table(directory, 'img_urls', [_as_text(value) for value in books['img_url'].tolist()])
+
+        # Lowercased titles separated by newlines, for substring search
+        _write_string_table(directory, 'search_titles', [title.lower() + '\n' for title in titles])
+
+        # Hashed title keys for exact title lookups
+        for name, table in _title_key_tables(titles).items():
+            np.save(os.path.join(directory, f'{name}.npy'), table)
+
+        for field, name in (('author', 'author'), ('publisher', 'publisher')):
+            values = [_as_text(value) for value in books[field].tolist()]
+            names = sorted(set(values))
+            codes = {value: code for code, value in enumerate(names)}
+            _write_string_table(directory, f'{name}_names', names)
+            np.save(os.path.join(directory, f'{name}_codes.npy'),
+                    np.fromiter((codes[value] for value in values), dtype=np.int32, count=len(values)))
+
+        np.save(os.path.join(directory, 'years.npy'),
+                np.fromiter((_as_year(value) for value in books['year'].tolist()), dtype=np.int16, count=len(books)))
+
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            json.dump({'num_books': len(books)}, f)
+
+    @classmethod
+    def open(cls, directory):
+        """Open a catalogue written by build(), or return None if it does not exist"""
+        if not os.path.exists(os.path.join(str(directory), 'meta.json')):
+            return None
+        return cls(directory)
+
+    def __len__(self):
+        return self.meta['num_books']
+
+    def __contains__(self, book_id):
+        return 0 <= book_id < len(self)
+
+    def title(self, book_id):
+        return self.titles[book_id]
+
+    def get(self, book_id):
+        """Return the metadata of one book as a dict"""
+        year = int(self.years[book_id])
+        return {
+            'book_id': int(book_id),
+            'isbn': self.isbns[book_id],
+            'title': self.titles[book_id],
+            'author': self.author_names[int(self.author_codes[book_id])],
+            'year': year,
+            'publisher': self.publisher_names[int(self.publisher_codes[book_id])],
+            'img_url': self.img_urls[book_id]
+        }
+
+    def search(self, query, limit=10):
+        """Return ids of books whose title contains the query, case-insensitively"""
+        needle = query.lower().replace('\n', ' ').encode('utf-8')
+        if not needle or len(self) == 0:
+            return []
+
+        data = self.search_titles.data
+        results = []
+        position = data.find(needle)
+        while position != -1 and len(results) < limit:
+            row = self.search_titles.row_at(position)
+            results.append(row)
+            # Continue after the end of the matched title
+            position = data.find(needle, int(self.search_titles.offsets[row + 1]))
+        return results
+
+    def _lookup_key(self, table, key, matches):
+        """Return the first book id under a key hash whose title passes matches(), or None"""
+        hashes, book_ids = self._key_tables[table], self._key_tables[f'{table}_ids']
+        target = np.uint64(_key_hash(key))
+        position = int(np.searchsorted(hashes, target))
+        while position < len(hashes) and hashes[position] == target:
+            book_id = int(book_ids[position])
+            # Hashes can collide, so the title itself decides
+            if matches(self.titles[book_id]):
+                return book_id
+            position += 1
+        return None
+
+    def find_title(self, query):
+        """Return (book_id, title) of a book whose normalized title or main title equals the query, or None"""
+        key = normalize_title(query)
+        if not key:
+            return None
+        if self._key_tables is None:
+            # Catalogues written before the key tables existed
+            print("Catalogue has no title key tables; hashing titles in memory")
+            self._key_tables = _title_key_tables([self.titles[book_id] for book_id in range(len(self))])
+        
+        book_id = self._lookup_key('title_keys', key, lambda title: normalize_title(title) == key)
+        if book_id is None:
+            short_key = normalize_title(main_title(query))
+            for candidate in dict.fromkeys((key, short_key)):
+                if not candidate:
+                    continue
+                book_id = self._lookup_key('main_title_keys', candidate,
+                                           lambda title: normalize_title(main_title(title)) == candidate)
+                if book_id is not None:
+                    break
+        if book_id is None:
+            return None
+        return book_id, self.titles[book_id]
+    
+    def close(self):
+        for table in (self.isbns, self.titles, self.img_urls, self.search_titles,
+                      self.author_names, self.publisher_names):
+            table.close()
@@ -0,0 +1,96 @@
+import numpy as np
+from config import Config
+
+
+def _grouped_top(codes, popularity, num_codes, limit):
+    """Per code, the positions of the `limit` most popular items as (offsets, positions)"""
+    order = np.lexsort((-popularity, codes))
+    sorted_codes = codes[order]
+    group_starts = np.searchsorted(sorted_codes, sorted_codes, side='left')
+    keep = np.arange(len(order)) - group_starts < limit
+    counts = np.bincount(sorted_codes[keep], minlength=num_codes)
+    offsets = np.zeros(num_codes + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets, order[keep].astype(np.int32)
+
+
+class ColdStartFallbacks:
+    """Precomputed recommendations for catalogue books outside the trained set
+
+    For every author and publisher code of the catalogue, the most popular
+    trained books with that code are stored as a CSR-style list of item
+    positions (positions in the served book id array). A lookup walks the
+    book's author list, then its publisher list, then overall popularity,
+    so any catalogue book gets results in constant time.
+    """
+
+    FIELDS = ('author_offsets', 'author_items', 'publisher_offsets', 'publisher_items', 'popular_items')
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+
+    @classmethod
+    def build(cls, book_ids, popularity, catalogue, limit=Config.COLD_START_FALLBACKS):
+        """Build the lists over served books from catalogue author and publisher codes"""
+        book_ids = np.asarray(book_ids, dtype=np.int64)
+        popularity = np.asarray(popularity, dtype=np.int64)
+
+        arrays = {}
+        for field, codes, names in (('author', catalogue.author_codes, catalogue.author_names),
+                                    ('publisher', catalogue.publisher_codes, catalogue.publisher_names)):
+            offsets, items = _grouped_top(np.asarray(codes[book_ids], dtype=np.int64), popularity,
+                                          len(names), limit)
+            arrays[f'{field}_offsets'] = offsets
+            arrays[f'{field}_items'] = items
+        arrays['popular_items'] = np.argsort(-popularity, kind='stable')[:limit].astype(np.int32)
+        arrays['num_books'] = np.asarray(len(catalogue), dtype=np.int64)
+        return cls(arrays)
+
+    def to_arrays(self, prefix='cold_'):
+        return {f'{prefix}{name}': array for name, array in self.arrays.items()}
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix='cold_'):
+        """Return the fallbacks stored in a dict of arrays, or None if there are none"""
+        if f'{prefix}popular_items' not in arrays:
+            return None
+        names = cls.FIELDS + ('num_books',)
+        return cls({name: arrays[f'{prefix}{name}'] for name in names})
+
+    def matches(self, catalogue):
+        """Whether these lists were built against this catalogue's codes"""
+        return int(self.arrays['num_books']) == len(catalogue)
+
+    def score(self, position):
+        """Score of the result at a lookup position, the same whatever top_n was asked for
+
+        A lookup returns at most three tiers of `limit` items, and popular_items
+        holds `limit` items (fewer only if fewer books are served).
+        """
+        return 1.0 - position / (3 * max(len(self.arrays['popular_items']), 1))
+
+    def lookup(self, book_id, catalogue, top_n, exclude=()):
+        """Return up to top_n (item, tier) pairs: same author, then same publisher, then popular"""
+        results, seen = [], set(exclude)
+        tiers = (('author', int(catalogue.author_codes[book_id]), catalogue.author_names),
+                 ('publisher', int(catalogue.publisher_codes[book_id]), catalogue.publisher_names))
+
+        for field, code, names in tiers:
+            # Unknown authors and publishers share the empty name and say nothing
+            if not names[code]:
+                continue
+            offsets = self.arrays[f'{field}_offsets']
+            for item in self.arrays[f'{field}_items'][offsets[code]:offsets[code + 1]].tolist():
+                if len(results) >= top_n:
+                    return results
+                if item not in seen:
+                    seen.add(item)
+                    results.append((item, field))
+
+        for item in self.arrays['popular_items'].tolist():
+            if len(results) >= top_n:
+                break
+            if item not in seen:
+                seen.add(item)
+                results.append((item, 'popular'))
+        return results
@@ -9,6 +9,7 @@ class CollaborativeFilteringModel:
     def __init__(self):
         self.model = None
         self.book_pivot = None
+        self.id_to_row = None
         self.is_trained = False
     
     def train(self, final_rating):
@@ -16,12 +17,14 @@ class CollaborativeFilteringModel:
         try:
             print("Training collaborative filtering model...")
             
-            # Create user-item matrix
+            # Create user-item matrix, one row per book id
             self.book_pivot = final_rating.pivot_table(
-                index='title', 
+                index='book_id', 
                 columns='user_id', 
                 values='rating'
             ).fillna(0)
+            self.book_pivot.index = self.book_pivot.index.astype(np.int32)
+            self.id_to_row = pd.Series(np.arange(len(self.book_pivot), dtype=np.int32), index=self.book_pivot.index)
             
             book_sparse = csr_matrix(self.book_pivot.values)
             
@@ -36,38 +39,32 @@ class CollaborativeFilteringModel:
             print(f"Error training collaborative filtering model: {e}")
             self.is_trained = False
     
-    def get_recommendations(self, book_title, books_content, books, top_n=Config.DEFAULT_TOP_N):
+    def get_recommendations(self, book_id, catalogue, top_n=Config.DEFAULT_TOP_N):
         """Generate collaborative filtering recommendations"""
         if not self.is_trained:
             print("Model not trained yet")
             return []
         
         try:
-            if book_title not in self.book_pivot.index:
-                print(f"Book '{book_title}' not found in collaborative filtering data")
+            if book_id not in self.id_to_row.index:
+                print(f"Book id {book_id} not found in collaborative filtering data")
                 return []
                 
-            book_idx = np.where(self.book_pivot.index == book_title)[0][0]
+            book_idx = self.id_to_row[book_id]
             distances, indices = self.model.kneighbors(
                 self.book_pivot.iloc[book_idx, :].values.reshape(1, -1),
-                n_neighbors=top_n+1
+                n_neighbors=min(top_n+1, len(self.book_pivot))
             )
             
             recommendations = []
             for i in range(1, len(indices.flatten())):
-                title = self.book_pivot.index[indices.flatten()[i]]
-                book_info = books_content[books_content['title'] == title]
-                
-                if book_info.empty:
-                    book_info = books[books['title'] == title]
-                    if book_info.empty:
-                        continue
-                
-                book_info = book_info.iloc[0]
+                neighbor_id = int(self.book_pivot.index[indices.flatten()[i]])
+                book_info = catalogue.get(neighbor_id)
                 img_url = self._validate_image_url(book_info['img_url'])
                 
                 recommendations.append({
-                    'title': title,
+                    'book_id': neighbor_id,
+                    'title': book_info['title'],
                     'author': book_info['author'],
                     'year': book_info['year'],
                     'publisher': book_info['publisher'],
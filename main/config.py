@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 class Config:
@@ -5,8 +6,13 @@ class Config:
     # Paths
     # BASE_DIR = Path(__file__).parent.absolute()
     BASE_DIR = Path(__file__).parent.parent.absolute()
-    DATA_DIR = BASE_DIR / 'data'
-    MODELS_DIR = BASE_DIR / 'models'
+    DATA_DIR = Path(os.environ.get('BOOKSAGE_DATA_DIR', BASE_DIR / 'data'))
+    MODELS_DIR = Path(os.environ.get('BOOKSAGE_MODELS_DIR', BASE_DIR / 'models'))
+    
+    # Content-addressed cache of training stage outputs
+    STAGE_CACHE_DIR = Path(os.environ.get('BOOKSAGE_CACHE_DIR', BASE_DIR / '.stage_cache'))
+    STAGE_CACHE_ENABLED = True
+    STAGE_CACHE_KEEP = 3
     
     # Data files
     BOOKS_FILE = 'BX-Books.csv'
@@ -18,10 +24,65 @@ class Config:
     MIN_BOOK_RATINGS = 50
     TFIDF_MAX_FEATURES = 10000
     
+    # Content index: 'tfidf' (fitted vocabulary, full similarity matrix) or
+    # 'hashed' (incrementally extendable, see HashedContentIndex)
+    CONTENT_INDEX_MODE = 'tfidf'
+    HASHED_FEATURES = 2 ** 18
+    HASHED_MAX_STAGED = 256
+    
     # Recommendation parameters
     DEFAULT_TOP_N = 10
     HYBRID_CF_WEIGHT = 0.6
     HYBRID_CB_WEIGHT = 0.4
+    RESOLVER_MIN_SIMILARITY = 0.5
+    RESOLVER_PROBE_GRAMS = 8
+    RESOLVER_MAX_CANDIDATES = 32
+    COLD_START_FALLBACKS = 30
+    
+    # Serving artifact parameters
+    SERVING_NEIGHBORS = 50
+    SERVING_BLOCK_SIZE = 1024
+    ARTIFACT_QUANTIZE = False
+    ARTIFACT_SCORE_BITS = 16
+    QUANTIZE_MIN_OVERLAP = 0.95
+    QUANTIZE_MAX_SCORE_ERROR = 0.01
+    QUANTIZE_CHECK_TOP_N = 10
+    QUANTIZE_CHECK_SAMPLE = 2000
+    
+    # Request execution in the web app
+    SERVING_WORKERS = 4
+    SERVING_MAX_PENDING = 64
+    SERVING_RETRY_AFTER = 1
+    # Request threads per server process (gunicorn --threads, or the ASGI entry point)
+    SERVER_THREADS = 8
+    BATCH_MAX_TITLES = 50
+    
+    # Sharded serving: comma-separated shard server URLs; empty serves from one artifact
+    SHARD_URLS = [url for url in os.environ.get('BOOKSAGE_SHARDS', '').split(',') if url]
+    SHARD_BASE_PORT = 8101
+    SHARD_TIMEOUT = 2.0
+    
+    # HTTP caching of responses
+    HTTP_CACHE_MAX_AGE = 300
+    HTTP_GZIP_MIN_BYTES = 512
+    HTTP_GZIP_LEVEL = 6
+    
+    # Streaming popularity from the append-only rating event log
+    RATING_EVENT_LOG = Path(os.environ.get('BOOKSAGE_RATING_LOG', DATA_DIR / 'rating_events.log'))
+    RATING_LOG_CHUNK_BYTES = 8 << 20
+    POPULARITY_SNAPSHOT_FILE = 'popularity_snapshot.npz'
+    POPULAR_HALF_LIFE = 30 * 24 * 3600
+    TRENDING_HALF_LIFE = 24 * 3600
+    POPULARITY_TOP_K = 100
+    POPULARITY_POLL_INTERVAL = 5
+    POPULARITY_SNAPSHOT_INTERVAL = 300
+    
+    # Evaluation parameters
+    EVAL_TEST_FRACTION = 0.2
+    EVAL_K = 10
+    EVAL_WORKERS = 4
+    EVAL_BATCH_SIZE = 512
+    EVAL_RANDOM_STATE = 42
     
     # Image settings
     DEFAULT_IMAGE_URL = "https://via.placeholder.com/150x220?text=No+Image"
\ No newline at end of file
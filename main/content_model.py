@@ -1,33 +1,55 @@
+import numpy as np
 import pandas as pd
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 from config import Config
+from hashed_content_index import HashedContentIndex
+from data_preprocessor import DataPreprocessor
 
 class ContentBasedModel:
     
     def __init__(self):
         self.tfidf = None
         self.content_sim_matrix = None
-        self.title_to_idx = None
+        self.content_vectors = None
+        self.id_to_idx = None
+        self.book_ids = None
+        self.index = None
+        self.mode = Config.CONTENT_INDEX_MODE
         self.is_trained = False
     
+    def __setstate__(self, state):
+        """Models pickled before the hashed mode existed are TF-IDF models"""
+        state.setdefault('mode', 'tfidf')
+        state.setdefault('index', None)
+        state.setdefault('content_vectors', None)
+        self.__dict__.update(state)
+    
     def train(self, books_content):
         """Train the content-based model"""
         try:
-            print("Training content-based model...")
-            
-            # TF-IDF Vectorizer
-            self.tfidf = TfidfVectorizer(
-                stop_words='english', 
-                max_features=Config.TFIDF_MAX_FEATURES
-            )
+            print(f"Training content-based model ({self.mode})...")
             
-            tfidf_matrix = self.tfidf.fit_transform(books_content['content_features'])
-            self.content_sim_matrix = cosine_similarity(tfidf_matrix)
+            self.book_ids = books_content['book_id'].to_numpy(dtype=np.int32)
             
-            # Create title to index mapping
-            self.title_to_idx = pd.Series(books_content.index, index=books_content['title'])
-            self.title_to_idx.drop_duplicates(inplace=True)
+            if self.mode == 'hashed':
+                # Stateless hashed features; books can be added later without refitting
+                self.index = HashedContentIndex()
+                self.index.build(self.book_ids, books_content['content_features'].tolist())
+            else:
+                # TF-IDF Vectorizer
+                self.tfidf = TfidfVectorizer(
+                    stop_words='english', 
+                    max_features=Config.TFIDF_MAX_FEATURES
+                )
+                
+                tfidf_matrix = self.tfidf.fit_transform(books_content['content_features'])
+                self.content_sim_matrix = cosine_similarity(tfidf_matrix)
+                # Column-major, so probing touches only the columns of a query's terms
+                self.content_vectors = tfidf_matrix.tocsc()
+                
+                # Map book ids to matrix rows
+                self.id_to_idx = pd.Series(np.arange(len(self.book_ids), dtype=np.int32), index=self.book_ids)
             
             self.is_trained = True
             print("Content-based model trained successfully")
@@ -36,31 +58,36 @@ class ContentBasedModel:
             print(f"Error training content-based model: {e}")
             self.is_trained = False
     
-    def get_recommendations(self, book_title, books_content, top_n=Config.DEFAULT_TOP_N):
+    def get_recommendations(self, book_id, catalogue, top_n=Config.DEFAULT_TOP_N):
         """Generate content-based recommendations"""
         if not self.is_trained:
             print("Model not trained yet")
             return []
         
         try:
-            if book_title not in self.title_to_idx:
-                print(f"Book '{book_title}' not found in content-based data")
+            if self.mode == 'hashed':
+                neighbors = self.index.neighbors_of(book_id, top_n)
+            else:
+                neighbors = self._matrix_neighbors(book_id, top_n)
+            
+            if neighbors is None:
+                # Books outside the trained set are probed by their content features
+                if book_id in catalogue:
+                    neighbors = self.query(DataPreprocessor.content_features_for(catalogue.get(book_id)), top_n)
+            
+            if neighbors is None:
+                print(f"Book id {book_id} not found in content-based data")
                 return []
-                
-            cb_idx = self.title_to_idx[book_title]
-            sim_scores = list(enumerate(self.content_sim_matrix[cb_idx]))
-            sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
-            sim_scores = sim_scores[1:top_n+1]
             
             recommendations = []
-            for i, score in sim_scores:
-                title = books_content['title'].iloc[i]
-                book_info = books_content[books_content['title'] == title].iloc[0]
+            for neighbor_id, score in neighbors:
+                book_info = catalogue.get(neighbor_id)
                 
                 img_url = self._validate_image_url(book_info['img_url'])
                 
                 recommendations.append({
-                    'title': title,
+                    'book_id': neighbor_id,
+                    'title': book_info['title'],
                     'author': book_info['author'],
                     'year': book_info['year'],
                     'publisher': book_info['publisher'],
@@ -75,6 +102,72 @@ class ContentBasedModel:
             print(f"Error in content recommendations: {e}")
             return []
     
+    def _matrix_neighbors(self, book_id, top_n):
+        """Top-n (book_id, score) pairs from the full similarity matrix"""
+        if book_id not in self.id_to_idx.index:
+            return None
+        
+        cb_idx = self.id_to_idx[book_id]
+        sim_scores = self.content_sim_matrix[cb_idx].copy()
+        sim_scores[cb_idx] = -np.inf
+        
+        num_results = min(top_n, len(sim_scores) - 1)
+        if num_results <= 0:
+            return []
+        top_idx = np.argpartition(-sim_scores, num_results - 1)[:num_results]
+        top_idx = top_idx[np.argsort(-sim_scores[top_idx], kind='stable')]
+        return [(int(self.book_ids[i]), float(sim_scores[i])) for i in top_idx]
+    
+    def query(self, content_features, top_n=Config.DEFAULT_TOP_N):
+        """Top-n (book_id, score) pairs for arbitrary content features, or None if the model cannot probe"""
+        if not content_features:
+            return None
+        if self.mode == 'hashed':
+            return self.index.query(content_features, top_n)
+        if self.content_vectors is None:
+            return None
+        
+        vector = self.tfidf.transform([content_features])
+        if vector.nnz == 0:
+            return []
+        sim_scores = np.asarray(self.content_vectors[:, vector.indices] @ vector.data).ravel()
+        
+        num_results = min(top_n, len(sim_scores))
+        top_idx = np.argpartition(-sim_scores, num_results - 1)[:num_results]
+        top_idx = top_idx[np.argsort(-sim_scores[top_idx], kind='stable')]
+        return [(int(self.book_ids[i]), float(sim_scores[i])) for i in top_idx if sim_scores[i] > 0]
+    
+    def rows_of(self, book_ids):
+        """Map book ids to content rows, -1 for books without content"""
+        if self.mode == 'hashed':
+            return np.array([self.index.id_to_row.get(int(book_id), -1) for book_id in book_ids], dtype=np.int64)
+        return self.id_to_idx.reindex(book_ids, fill_value=-1).to_numpy()
+    
+    def similarity(self, rows, cols):
+        """Dense content similarity block between two sets of content rows"""
+        if self.mode == 'hashed':
+            return self.index.similarity(rows, cols)
+        return self.content_sim_matrix[np.ix_(rows, cols)]
+    
+    def add_book(self, book_id, content_features):
+        """Insert or update one book in the hashed content index without retraining"""
+        if self.mode != 'hashed' or not self.is_trained:
+            print("Incremental updates need a trained model with CONTENT_INDEX_MODE = 'hashed'")
+            return False
+        
+        try:
+            self.index.add_or_update(book_id, content_features)
+            return True
+        
+        except Exception as e:
+            print(f"Error adding book to content index: {e}")
+            return False
+    
+    def compact(self):
+        """Refresh IDF weights and rebuild all neighbor lists of the hashed index"""
+        if self.mode == 'hashed' and self.is_trained:
+            self.index.compact()
+    
     def _validate_image_url(self, img_url):
         """Validate and return proper image URL"""
         if not isinstance(img_url, str) or not img_url.startswith('http'):
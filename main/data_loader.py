@@ -13,7 +13,8 @@ class DataLoader:
                 Config.DATA_DIR / Config.BOOKS_FILE, 
                 sep=';', 
                 on_bad_lines='skip', 
-                encoding='latin-1'
+                encoding='latin-1',
+                dtype={'ISBN': str}
             )
             
             # Select and rename columns
@@ -65,7 +66,8 @@ class DataLoader:
                 Config.DATA_DIR / Config.RATINGS_FILE, 
                 sep=';', 
                 on_bad_lines='skip', 
-                encoding='latin-1'
+                encoding='latin-1',
+                dtype={'ISBN': str}
             )
             
             ratings.rename(columns={
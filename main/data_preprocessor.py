@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 from config import Config
 
@@ -11,6 +12,13 @@ class DataPreprocessor:
         self.final_rating = None
         self.books_content = None
     
+    def assign_book_ids(self):
+        """Assign a canonical int32 book id per ISBN; books becomes the id <-> ISBN/title table"""
+        self.books = self.books.drop_duplicates('ISBN').reset_index(drop=True)
+        self.books.insert(0, 'book_id', np.arange(len(self.books), dtype=np.int32))
+        print(f"Assigned ids to {len(self.books)} books")
+        return self
+    
     def filter_active_users(self):
         """Filter users with more than MIN_USER_RATINGS ratings"""
         user_ratings_count = self.ratings['user_id'].value_counts()
@@ -27,20 +35,19 @@ class DataPreprocessor:
     
     def filter_popular_books(self):
         """Filter books with at least MIN_BOOK_RATINGS ratings"""
-        book_ratings_count = self.ratings_with_books.groupby('title')['rating'].count().reset_index()
+        book_ratings_count = self.ratings_with_books.groupby('book_id')['rating'].count().reset_index()
         book_ratings_count.rename(columns={'rating': 'num_ratings'}, inplace=True)
         
-        self.final_rating = self.ratings_with_books.merge(book_ratings_count, on='title')
+        self.final_rating = self.ratings_with_books.merge(book_ratings_count, on='book_id')
         self.final_rating = self.final_rating[self.final_rating['num_ratings'] >= Config.MIN_BOOK_RATINGS]
-        self.final_rating.drop_duplicates(['user_id', 'title'], inplace=True)
+        self.final_rating.drop_duplicates(['user_id', 'book_id'], inplace=True)
         
         print(f"Final rating data shape: {self.final_rating.shape}")
         return self
     
     def prepare_content_features(self):
         """Prepare content-based features"""
-        self.books_content = self.books.drop_duplicates('title')
-        self.books_content = self.books_content[self.books_content['title'].isin(self.final_rating['title'])]
+        self.books_content = self.books[self.books['book_id'].isin(self.final_rating['book_id'])].reset_index(drop=True)
         
         self.books_content['content_features'] = (
             self.books_content['title'] + ' ' + 
@@ -52,6 +59,12 @@ class DataPreprocessor:
         print(f"Books content shape: {self.books_content.shape}")
         return self
     
+    @staticmethod
+    def content_features_for(book):
+        """Content features of a single book, in the same format as prepare_content_features"""
+        publisher = book['publisher'] if isinstance(book['publisher'], str) else ''
+        return f"{book['title']} {book['author']} {publisher} {book['year']}"
+    
     def get_processed_data(self):
         """Return all processed data"""
         return {
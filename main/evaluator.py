@@ -0,0 +1,208 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from sklearn.preprocessing import normalize
+from config import Config
+from collaborative_model import CollaborativeFilteringModel
+from content_model import ContentBasedModel
+
+# Per-process state for the scoring pool, populated by _init_worker
+_worker_state = {}
+
+
+def _init_worker(similarity, profiles, truth, k):
+    """Store the shared scoring inputs in the worker process"""
+    _worker_state['similarity'] = similarity
+    _worker_state['profiles'] = profiles
+    _worker_state['truth'] = truth
+    _worker_state['k'] = k
+
+
+def _score_batch(bounds):
+    """Score a contiguous block of test users and return metric sums"""
+    start, stop = bounds
+    similarity = _worker_state['similarity']
+    profiles = _worker_state['profiles'][start:stop]
+    truth = _worker_state['truth'][start:stop].toarray() > 0
+    k = _worker_state['k']
+
+    # Score every item for every user in the block with one matrix product
+    scores = np.asarray(profiles @ similarity)
+    scores[profiles.toarray() > 0] = -np.inf
+
+    k = min(k, scores.shape[1])
+    top_k = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top_k, axis=1), axis=1)
+    top_k = np.take_along_axis(top_k, order, axis=1)
+
+    hits = np.take_along_axis(truth, top_k, axis=1)
+    num_relevant = truth.sum(axis=1)
+    num_hits = hits.sum(axis=1)
+
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    dcg = (hits * discounts).sum(axis=1)
+    ideal_counts = np.minimum(num_relevant, k)
+    idcg = np.cumsum(discounts)[np.maximum(ideal_counts - 1, 0)]
+
+    return {
+        'recall': float((num_hits / np.maximum(num_relevant, 1)).sum()),
+        'precision': float((num_hits / k).sum()),
+        'ndcg': float((dcg / idcg).sum()),
+        'recommended': np.unique(top_k)
+    }
+
+
+class ModelEvaluator:
+    """Offline evaluation of the recommenders on held-out ratings"""
+
+    def __init__(self, processed_data, k=Config.EVAL_K, test_fraction=Config.EVAL_TEST_FRACTION,
+                 workers=Config.EVAL_WORKERS, batch_size=Config.EVAL_BATCH_SIZE,
+                 random_state=Config.EVAL_RANDOM_STATE):
+        self.final_rating = processed_data['final_rating']
+        self.books_content = processed_data['books_content']
+        self.k = k
+        self.test_fraction = test_fraction
+        self.workers = workers
+        self.batch_size = batch_size
+        self.random_state = random_state
+        self.timings = {}
+
+    def split_ratings(self):
+        """Hold out a fraction of each user's ratings as the test set"""
+        shuffled = self.final_rating.sample(frac=1.0, random_state=self.random_state)
+        position = shuffled.groupby('user_id').cumcount()
+        user_counts = shuffled.groupby('user_id')['user_id'].transform('size')
+
+        # Users with a single rating keep it for training
+        num_test = np.floor(user_counts * self.test_fraction).astype(int)
+        num_test = num_test.where(user_counts < 2, num_test.clip(lower=1))
+        is_test = position < num_test
+
+        train, test = shuffled[~is_test], shuffled[is_test]
+        print(f"Split ratings: {len(train)} train / {len(test)} test")
+        return train, test
+
+    def _build_similarities(self, train):
+        """Train both models on the training split and align their item similarities"""
+        cf_model = CollaborativeFilteringModel()
+        cf_model.train(train)
+        if not cf_model.is_trained:
+            return None
+
+        book_ids = cf_model.book_pivot.index
+        item_vectors = normalize(csr_matrix(cf_model.book_pivot.values))
+        cf_sim = np.asarray((item_vectors @ item_vectors.T).todense())
+        np.fill_diagonal(cf_sim, 0.0)
+
+        books_content = self.books_content[self.books_content['book_id'].isin(book_ids)].reset_index(drop=True)
+        cb_model = ContentBasedModel()
+        cb_model.train(books_content)
+        if not cb_model.is_trained:
+            return None
+
+        # Map pivot rows onto content rows; books without content get zero similarity
+        positions = cb_model.rows_of(book_ids)
+        valid = np.where(positions >= 0)[0]
+        cb_sim = np.zeros_like(cf_sim)
+        cb_sim[np.ix_(valid, valid)] = cb_model.similarity(positions[valid], positions[valid])
+        np.fill_diagonal(cb_sim, 0.0)
+
+        return book_ids, {
+            'collaborative': cf_sim,
+            'content': cb_sim,
+            'hybrid': Config.HYBRID_CF_WEIGHT * cf_sim + Config.HYBRID_CB_WEIGHT * cb_sim
+        }
+
+    def _build_user_matrices(self, train, test, book_ids):
+        """Build binary train-profile and test-truth matrices for the test users"""
+        item_idx = pd.Index(book_ids)
+        test = test[test['book_id'].isin(item_idx)]
+        user_idx = pd.Index(test['user_id'].unique())
+
+        def to_matrix(frame):
+            frame = frame[frame['user_id'].isin(user_idx) & frame['book_id'].isin(item_idx)]
+            rows = user_idx.get_indexer(frame['user_id'])
+            cols = item_idx.get_indexer(frame['book_id'])
+            data = np.ones(len(frame), dtype=np.float32)
+            matrix = csr_matrix((data, (rows, cols)), shape=(len(user_idx), len(item_idx)))
+            matrix.data[:] = 1.0
+            return matrix
+
+        return to_matrix(train), to_matrix(test)
+
+    def _score(self, similarity, profiles, truth):
+        """Compute ranking metrics for all test users in batches"""
+        num_users = profiles.shape[0]
+        batches = [(start, min(start + self.batch_size, num_users))
+                   for start in range(0, num_users, self.batch_size)]
+
+        if self.workers > 1 and len(batches) > 1:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                     initargs=(similarity, profiles, truth, self.k)) as pool:
+                results = list(pool.map(_score_batch, batches))
+        else:
+            _init_worker(similarity, profiles, truth, self.k)
+            results = [_score_batch(batch) for batch in batches]
+
+        recommended = np.unique(np.concatenate([r['recommended'] for r in results]))
+        return {
+            f'recall@{self.k}': sum(r['recall'] for r in results) / num_users,
+            f'precision@{self.k}': sum(r['precision'] for r in results) / num_users,
+            f'ndcg@{self.k}': sum(r['ndcg'] for r in results) / num_users,
+            'coverage': len(recommended) / similarity.shape[0]
+        }
+
+    def evaluate(self):
+        """Run the full evaluation and return a report per method"""
+        print("="*60)
+        print("Starting offline evaluation...")
+        print("="*60)
+
+        start = time.perf_counter()
+        train, test = self.split_ratings()
+        self.timings['split_s'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        built = self._build_similarities(train)
+        if built is None:
+            print("Failed to train models for evaluation")
+            return None
+        book_ids, similarities = built
+        profiles, truth = self._build_user_matrices(train, test, book_ids)
+        self.timings['train_s'] = time.perf_counter() - start
+
+        num_users = profiles.shape[0]
+        if num_users == 0:
+            print("No test users with held-out ratings in the trained catalogue")
+            return None
+
+        report = {'num_users': num_users, 'num_items': len(book_ids), 'k': self.k, 'methods': {}}
+        for method, similarity in similarities.items():
+            start = time.perf_counter()
+            metrics = self._score(similarity, profiles, truth)
+            elapsed = time.perf_counter() - start
+            metrics['score_s'] = elapsed
+            metrics['latency_ms_per_user'] = 1000 * elapsed / num_users
+            report['methods'][method] = metrics
+
+        report['timings'] = dict(self.timings)
+        self.print_report(report)
+        return report
+
+    @staticmethod
+    def print_report(report):
+        """Display an evaluation report"""
+        k = report['k']
+        print(f"\nEvaluated {report['num_users']} users over {report['num_items']} books")
+        print("-" * 78)
+        print(f"{'method':<15}{'recall@'+str(k):>11}{'prec@'+str(k):>11}{'ndcg@'+str(k):>11}"
+              f"{'coverage':>10}{'score s':>9}{'ms/user':>11}")
+        for method, m in report['methods'].items():
+            print(f"{method:<15}{m[f'recall@{k}']:>11.4f}{m[f'precision@{k}']:>11.4f}"
+                  f"{m[f'ndcg@{k}']:>11.4f}{m['coverage']:>10.3f}{m['score_s']:>9.2f}"
+                  f"{m['latency_ms_per_user']:>11.3f}")
+        print("-" * 78)
+        timings = report['timings']
+        print(f"Split: {timings['split_s']:.2f}s  Train: {timings['train_s']:.2f}s")
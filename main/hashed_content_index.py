@@ -0,0 +1,217 @@
+import numpy as np
+from scipy.sparse import csr_matrix, vstack
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+from config import Config
+
+
+class HashedContentIndex:
+    """Content index over a stateless hashed feature space
+
+    Term counts come from a HashingVectorizer, so new documents can be
+    vectorized without refitting a vocabulary. Document frequencies are
+    kept separately; IDF weights are refreshed by compact(). Each book
+    keeps a top-k neighbor list that is patched in place on insert.
+    """
+
+    def __init__(self, n_features=Config.HASHED_FEATURES, top_k=Config.SERVING_NEIGHBORS):
+        self.n_features = n_features
+        self.top_k = top_k
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features,
+            stop_words='english',
+            alternate_sign=False,
+            norm=None
+        )
+        self.book_ids = np.zeros(0, dtype=np.int32)
+        self.id_to_row = {}
+        self.doc_freq = np.zeros(n_features, dtype=np.int64)
+        self.idf = np.ones(n_features, dtype=np.float64)
+        self.term_counts = csr_matrix((0, n_features))
+        self.vectors = csr_matrix((0, n_features))
+        self._vectors_csc = self.vectors.tocsc()
+        # Rows inserted or replaced since the last compaction: row -> (counts, vector)
+        self._staged = {}
+        self.neighbors = np.zeros((0, 0), dtype=np.int32)
+        self.scores = np.zeros((0, 0), dtype=np.float32)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _counts(self, texts):
+        return self.vectorizer.transform(texts).astype(np.float64)
+
+    def _weight(self, counts):
+        return normalize(csr_matrix(counts.multiply(self.idf)))
+
+    def build(self, book_ids, texts):
+        """Index an initial set of books and compute all neighbor lists"""
+        self.book_ids = np.asarray(book_ids, dtype=np.int32)
+        self.id_to_row = {int(book_id): row for row, book_id in enumerate(self.book_ids)}
+        self.size = len(self.book_ids)
+        self.term_counts = self._counts(texts)
+        self.doc_freq = np.bincount(self.term_counts.indices, minlength=self.n_features).astype(np.int64)
+        self._staged = {}
+        self.compact()
+
+    def compact(self):
+        """Fold staged rows in, refresh IDF weights and rebuild all neighbor lists"""
+        base = self.term_counts.shape[0]
+        if self._staged:
+            replaced = [row for row in self._staged if row < base]
+            if replaced:
+                term_counts = self.term_counts.tolil()
+                for row in replaced:
+                    term_counts[row] = self._staged[row][0]
+                self.term_counts = term_counts.tocsr()
+            added = [self._staged[row][0] for row in range(base, self.size)]
+            if added:
+                self.term_counts = vstack([self.term_counts] + added).tocsr()
+            self._staged = {}
+        self.book_ids = self.book_ids[:self.size].copy()
+
+        num_docs = max(self.size, 1)
+        self.idf = np.log((1.0 + num_docs) / (1.0 + self.doc_freq)) + 1.0
+        self.vectors = self._weight(self.term_counts)
+        self._vectors_csc = self.vectors.tocsc()
+
+        k = min(self.top_k, max(self.size - 1, 0))
+        self.neighbors = np.full((self.size, k), -1, dtype=np.int32)
+        self.scores = np.zeros((self.size, k), dtype=np.float32)
+        if k == 0:
+            return
+
+        for start in range(0, self.size, Config.SERVING_BLOCK_SIZE):
+            stop = min(start + Config.SERVING_BLOCK_SIZE, self.size)
+            block = (self.vectors[start:stop] @ self.vectors.T).toarray()
+            block[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+            top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(block, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind='stable')
+            self.neighbors[start:stop] = np.take_along_axis(top, order, axis=1)
+            self.scores[start:stop] = np.take_along_axis(top_scores, order, axis=1)
+
+    def _similarities(self, vector):
+        """Cosine similarity of one weighted vector against every indexed row"""
+        sims = np.zeros(self.size, dtype=np.float64)
+        base = self._vectors_csc.shape[0]
+        if base and vector.nnz:
+            # Only the columns of the query's terms are touched
+            sims[:base] = self._vectors_csc[:, vector.indices] @ vector.data
+        for row, (_, staged_vector) in self._staged.items():
+            sims[row] = staged_vector.multiply(vector).sum()
+        return sims
+
+    def _grow(self):
+        """Make room for one more row in the neighbor tables"""
+        if self.size < len(self.book_ids):
+            return
+        capacity = max(2 * len(self.book_ids), 16)
+        k = max(self.neighbors.shape[1], min(self.top_k, self.size))
+        neighbors = np.full((capacity, k), -1, dtype=np.int32)
+        scores = np.zeros((capacity, k), dtype=np.float32)
+        neighbors[:self.size, :self.neighbors.shape[1]] = self.neighbors[:self.size]
+        scores[:self.size, :self.scores.shape[1]] = self.scores[:self.size]
+        book_ids = np.full(capacity, -1, dtype=np.int32)
+        book_ids[:self.size] = self.book_ids[:self.size]
+        self.neighbors, self.scores, self.book_ids = neighbors, scores, book_ids
+
+    def _insert_neighbor(self, row, neighbor, score):
+        """Insert one (neighbor, score) into a row's sorted list if it makes the cut"""
+        neighbors, scores = self.neighbors[row], self.scores[row]
+        existing = np.where(neighbors == neighbor)[0]
+        if len(existing):
+            position = existing[0]
+            neighbors[position:-1] = neighbors[position + 1:].copy()
+            scores[position:-1] = scores[position + 1:].copy()
+            neighbors[-1], scores[-1] = -1, 0.0
+        filled = int((neighbors >= 0).sum())
+        position = int(np.searchsorted(-scores[:filled], -score, side='right'))
+        if position >= len(scores):
+            return
+        neighbors[position + 1:] = neighbors[position:-1].copy()
+        scores[position + 1:] = scores[position:-1].copy()
+        neighbors[position], scores[position] = neighbor, score
+
+    def add_or_update(self, book_id, text):
+        """Vectorize one book, insert or replace it, and patch affected neighbor lists"""
+        book_id = int(book_id)
+        counts = self._counts([text])
+        row = self.id_to_row.get(book_id)
+        is_update = row is not None
+
+        if is_update:
+            old_counts = self._staged[row][0] if row in self._staged else self.term_counts[row]
+            self.doc_freq[old_counts.indices] -= 1
+        else:
+            self._grow()
+            row = self.size
+            self.book_ids[row] = book_id
+            self.id_to_row[book_id] = row
+            self.size += 1
+        self.doc_freq[counts.indices] += 1
+
+        vector = self._weight(counts)
+        self._staged[row] = (counts, vector)
+
+        sims = self._similarities(vector)
+        sims[row] = -np.inf
+
+        k = self.neighbors.shape[1]
+        if k:
+            # The book's own list
+            valid = min(k, self.size - 1)
+            self.neighbors[row] = -1
+            self.scores[row] = 0.0
+            if valid > 0:
+                top = np.argpartition(-sims, valid - 1)[:valid]
+                top = top[np.argsort(-sims[top], kind='stable')]
+                self.neighbors[row, :valid] = top
+                self.scores[row, :valid] = sims[top]
+
+            # Other books whose lists the vector enters (or, on update, already appears in)
+            current = self.neighbors[:self.size]
+            floor = np.where(current[:, -1] >= 0, self.scores[:self.size, -1], -np.inf)
+            entering = sims > floor
+            if is_update:
+                entering |= (current == row).any(axis=1)
+            for other in np.where(entering)[0]:
+                if other != row:
+                    self._insert_neighbor(other, row, sims[other])
+
+        if len(self._staged) >= Config.HASHED_MAX_STAGED:
+            self.compact()
+        return row
+
+    def transform(self, text):
+        """Return the weighted, normalized vector of an arbitrary text"""
+        return self._weight(self._counts([text]))
+
+    def query(self, text, top_n=Config.DEFAULT_TOP_N):
+        """Return (book_id, score) pairs most similar to an arbitrary text"""
+        if self.size == 0:
+            return []
+        sims = self._similarities(self.transform(text))
+        top_n = min(top_n, self.size)
+        top = np.argpartition(-sims, top_n - 1)[:top_n]
+        top = top[np.argsort(-sims[top], kind='stable')]
+        return [(int(self.book_ids[i]), float(sims[i])) for i in top if sims[i] > 0]
+
+    def neighbors_of(self, book_id, top_n=Config.DEFAULT_TOP_N):
+        """Return (book_id, score) pairs from a book's neighbor list, or None if not indexed"""
+        row = self.id_to_row.get(int(book_id))
+        if row is None:
+            return None
+        result = []
+        for neighbor, score in zip(self.neighbors[row, :top_n], self.scores[row, :top_n]):
+            if neighbor < 0:
+                break
+            result.append((int(self.book_ids[neighbor]), float(score)))
+        return result
+
+    def similarity(self, rows, cols):
+        """Return the dense cosine similarity block between two sets of rows"""
+        if self._staged:
+            self.compact()
+        return (self.vectors[rows] @ self.vectors[cols].T).toarray()
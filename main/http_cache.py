@@ -0,0 +1,41 @@
+import gzip
+import hashlib
+import json
+from config import Config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def make_etag(model_version, *parts):
+    """Return a validator for a response that depends only on the model version and its inputs"""
+    digest = hashlib.sha1(model_version.encode('utf-8'))
+    for part in parts:
+        digest.update(b'\0')
+        digest.update(str(part).encode('utf-8'))
+    return digest.hexdigest()[:20]
+
+
+def encode_json(payload):
+    """Serialize a payload to compact UTF-8 JSON, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def accepts_gzip(accept_encoding):
+    """Whether an Accept-Encoding header allows gzip"""
+    for coding in (accept_encoding or '').split(','):
+        name, _, params = coding.strip().partition(';')
+        if name.strip().lower() in ('gzip', '*'):
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+def compress(body, accept_encoding, min_bytes=Config.HTTP_GZIP_MIN_BYTES):
+    """Return (body, content_encoding); small bodies and clients without gzip get the body as is"""
+    if len(body) < min_bytes or not accepts_gzip(accept_encoding):
+        return body, None
+    return gzip.compress(body, compresslevel=Config.HTTP_GZIP_LEVEL, mtime=0), 'gzip'
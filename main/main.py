@@ -1,4 +1,5 @@
 from recommendation_engine import RecommendationEngine
+from config import Config
 import sys
 
 def display_recommendations(recommendations, method_name):
@@ -63,13 +64,36 @@ def interactive_mode(engine):
                 print("Book not found.")
         else:
             # Show recommendations for entered book title
+            resolved_title = engine.resolve_title(user_input)
+            if resolved_title is None:
+                print("Book not found.")
+                continue
+            if resolved_title != user_input:
+                print(f"\nShowing results for: {resolved_title}")
+            all_recs = engine.get_all_recommendations(resolved_title)
             for method in ['collaborative', 'content', 'hybrid']:
-                recs = engine.get_recommendations(user_input, method=method)
-                display_recommendations(recs, method)
+                display_recommendations(all_recs.get(method, []), method)
 
 def main():
     engine = RecommendationEngine()
 
+    # Offline evaluation: python main.py evaluate [k] [workers]
+    if len(sys.argv) > 1 and sys.argv[1] == 'evaluate':
+        k = int(sys.argv[2]) if len(sys.argv) > 2 else Config.EVAL_K
+        workers = int(sys.argv[3]) if len(sys.argv) > 3 else Config.EVAL_WORKERS
+        if engine.evaluate_models(k=k, workers=workers) is None:
+            print("Evaluation failed. Exiting.")
+            sys.exit(1)
+        return
+
+    # Re-export the serving artifact from saved models: python main.py export [--quantize]
+    if len(sys.argv) > 1 and sys.argv[1] == 'export':
+        quantize = '--quantize' in sys.argv[2:] or Config.ARTIFACT_QUANTIZE
+        if not engine.load_trained_models() or not engine.export_serving_artifact(quantize=quantize):
+            print("Export failed. Exiting.")
+            sys.exit(1)
+        return
+
     # Try loading pre-trained models, if not found, train them
     if not engine.load_trained_models():
         print("\nNo trained models found. Training now...")
@@ -1,16 +1,48 @@
+import json
 import pickle
 from pathlib import Path
 from config import Config
 from collaborative_model import CollaborativeFilteringModel
 from content_model import ContentBasedModel
 from hybrid_model import HybridRecommendationModel
+from serving_artifact import ServingArtifact
+from catalogue_store import CatalogueStore
 
 class ModelManager:
     """Manage model saving and loading operations"""
     
+    REQUIRED_FILES = [
+        'cf_model.pkl', 'cb_model.pkl', 'books_content.pkl',
+        'final_rating.pkl', f'{CatalogueStore.DIRNAME}/meta.json'
+    ]
+    
+    # Stage cache key of the saved models, see RecommendationEngine.train_models
+    MANIFEST_FILE = 'stage_manifest.json'
+    
+    # Parts of a TF-IDF content model also saved on their own; hashed models have none
+    TFIDF_FILES = ['tfidf_vectorizer.pkl', 'content_sim_matrix.pkl', 'id_to_idx.pkl']
+    
     def __init__(self):
         Config.MODELS_DIR.mkdir(exist_ok=True)
     
+    def saved_stage_key(self):
+        """Return the stage key the saved models were written for, or None"""
+        try:
+            with open(Config.MODELS_DIR / self.MANIFEST_FILE) as f:
+                return json.load(f).get('save')
+        except (OSError, ValueError):
+            return None
+    
+    def write_stage_key(self, key):
+        """Record the stage key of the saved models; None invalidates it"""
+        path = Config.MODELS_DIR / self.MANIFEST_FILE
+        if key is None:
+            if path.exists():
+                path.unlink()
+            return
+        with open(path, 'w') as f:
+            json.dump({'save': key}, f)
+    
     def save_models(self, cf_model, cb_model, processed_data):
         """Save all models and processed data"""
         try:
@@ -20,19 +52,27 @@ class ModelManager:
                 'cf_model.pkl': cf_model,
                 'cb_model.pkl': cb_model,
                 'book_pivot.pkl': cf_model.book_pivot,
-                'tfidf_vectorizer.pkl': cb_model.tfidf,
-                'content_sim_matrix.pkl': cb_model.content_sim_matrix,
-                'title_to_idx.pkl': cb_model.title_to_idx,
                 'books_content.pkl': processed_data['books_content'],
-                'final_rating.pkl': processed_data['final_rating'],
-                'books_data.pkl': processed_data['books']
+                'final_rating.pkl': processed_data['final_rating']
             }
+            if cb_model.mode == 'tfidf':
+                model_files.update(zip(self.TFIDF_FILES, (cb_model.tfidf, cb_model.content_sim_matrix,
+                                                          cb_model.id_to_idx)))
+            else:
+                # Don't leave copies from an earlier TF-IDF model next to a hashed one
+                for filename in self.TFIDF_FILES:
+                    if (Config.MODELS_DIR / filename).exists():
+                        (Config.MODELS_DIR / filename).unlink()
+                        print(f"Removed: {filename}")
             
             for filename, data in model_files.items():
                 with open(Config.MODELS_DIR / filename, 'wb') as f:
                     pickle.dump(data, f)
                 print(f"Saved: {filename}")
             
+            if not self.export_serving_artifact(cf_model, cb_model, processed_data):
+                return False
+            
             print(f"All models saved successfully to: {Config.MODELS_DIR}")
             return True
             
@@ -40,18 +80,68 @@ class ModelManager:
             print(f"Error saving models: {e}")
             return False
     
+    def save_catalogue(self, books):
+        """Write the compact book catalogue and return it opened"""
+        try:
+            directory = Config.MODELS_DIR / CatalogueStore.DIRNAME
+            CatalogueStore.build(books, directory)
+            print(f"Saved: {CatalogueStore.DIRNAME}/ ({len(books)} books)")
+            return CatalogueStore.open(directory)
+            
+        except Exception as e:
+            print(f"Error saving catalogue: {e}")
+            return None
+    
+    def export_serving_artifact(self, cf_model, cb_model, processed_data, quantize=Config.ARTIFACT_QUANTIZE):
+        """Export the serving-only artifact (plain arrays, no sklearn or pandas objects)"""
+        try:
+            # The saved files no longer match a recorded stage key
+            self.write_stage_key(None)
+            artifact = ServingArtifact.build(cf_model, cb_model, processed_data)
+            if quantize:
+                artifact = self._quantize_artifact(artifact, cf_model, cb_model)
+            artifact.save(Config.MODELS_DIR / ServingArtifact.FILENAME)
+            print(f"Saved: {ServingArtifact.FILENAME} (version {artifact.model_version})")
+            return True
+            
+        except Exception as e:
+            print(f"Error exporting serving artifact: {e}")
+            return False
+    
+    def _quantize_artifact(self, artifact, cf_model, cb_model, score_bits=Config.ARTIFACT_SCORE_BITS):
+        """Quantize the artifact, keeping full precision if results drift too far from the exact model scores"""
+        quantized = artifact.quantize(score_bits)
+        agreement, score_error = quantized.exact_agreement(cf_model, cb_model)
+        print(f"Quantized artifact: {artifact.nbytes / 1e6:.1f} MB -> {quantized.nbytes / 1e6:.1f} MB, "
+              f"top-{Config.QUANTIZE_CHECK_TOP_N} agreement with exact scores " +
+              ", ".join(f"{method} {value:.3f}" for method, value in agreement.items()) +
+              f", max score error {score_error:.4f}")
+        
+        if min(agreement.values()) < Config.QUANTIZE_MIN_OVERLAP or score_error > Config.QUANTIZE_MAX_SCORE_ERROR:
+            print(f"Quantized results drift too far (agreement below {Config.QUANTIZE_MIN_OVERLAP} or score error "
+                  f"above {Config.QUANTIZE_MAX_SCORE_ERROR}); keeping the full-precision artifact")
+            return artifact
+        return quantized
+    
+    def load_serving_artifact(self):
+        """Load the serving-only artifact if it exists"""
+        path = Config.MODELS_DIR / ServingArtifact.FILENAME
+        if not path.exists():
+            return None
+        
+        try:
+            return ServingArtifact.load(path)
+        except Exception as e:
+            print(f"Error loading serving artifact: {e}")
+            return None
+    
     def load_models(self):
         """Load all models and data"""
         try:
             print("Loading models and processed data...")
             
             # Check if all required files exist
-            required_files = [
-                'cf_model.pkl', 'cb_model.pkl', 'books_content.pkl',
-                'final_rating.pkl', 'books_data.pkl'
-            ]
-            
-            for filename in required_files:
+            for filename in self.REQUIRED_FILES:
                 if not (Config.MODELS_DIR / filename).exists():
                     print(f"Required file not found: {filename}")
                     return None
@@ -70,8 +160,7 @@ class ModelManager:
             with open(Config.MODELS_DIR / 'final_rating.pkl', 'rb') as f:
                 final_rating = pickle.load(f)
             
-            with open(Config.MODELS_DIR / 'books_data.pkl', 'rb') as f:
-                books = pickle.load(f)
+            catalogue = CatalogueStore.open(Config.MODELS_DIR / CatalogueStore.DIRNAME)
             
             # Create hybrid model
             hybrid_model = HybridRecommendationModel(cf_model, cb_model)
@@ -84,7 +173,7 @@ class ModelManager:
                 'hybrid_model': hybrid_model,
                 'books_content': books_content,
                 'final_rating': final_rating,
-                'books': books
+                'catalogue': catalogue
             }
             
         except Exception as e:
@@ -93,9 +182,4 @@ class ModelManager:
     
     def models_exist(self):
         """Check if trained models exist"""
-        required_files = [
-            'cf_model.pkl', 'cb_model.pkl', 'books_content.pkl',
-            'final_rating.pkl', 'books_data.pkl'
-        ]
-        
-        return all((Config.MODELS_DIR / filename).exists() for filename in required_files)
\ No newline at end of file
+        return all((Config.MODELS_DIR / filename).exists() for filename in self.REQUIRED_FILES)
\ No newline at end of file
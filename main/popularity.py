@@ -0,0 +1,285 @@
+import json
+import os
+import threading
+import time
+import numpy as np
+from pathlib import Path
+from config import Config
+
+
+class DecayedCounter:
+    """Exponentially time-decayed counts per book id with an exact top-k
+
+    Counts are stored scaled to a landmark time: an event at time t adds
+    2 ** ((t - landmark) / half_life). All counts decay by the same factor,
+    so stored values never need touching and the ranking only changes when
+    events arrive. The top-k after a batch is therefore the top-k of the
+    previous top-k and the books the batch touched.
+    """
+
+    # Move the landmark forward before scaled values approach the float64 range
+    MAX_EXPONENT = 512
+
+    def __init__(self, half_life, capacity=Config.POPULARITY_TOP_K, landmark=None):
+        self.half_life = float(half_life)
+        self.capacity = capacity
+        # (landmark, values, book ids of the current top-k, unordered), replaced
+        # as one tuple so a concurrent top_k() never mixes two states
+        landmark = time.time() if landmark is None else float(landmark)
+        self._state = (landmark, np.zeros(0, dtype=np.float64), np.zeros(0, dtype=np.int64))
+
+    @property
+    def landmark(self):
+        return self._state[0]
+
+    @property
+    def values(self):
+        return self._state[1]
+
+    @property
+    def top(self):
+        return self._state[2]
+
+    def add(self, book_ids, timestamps, weights=None):
+        """Count one event per (book id, timestamp), optionally weighted"""
+        book_ids = np.asarray(book_ids, dtype=np.int64)
+        if not len(book_ids):
+            return
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        landmark, values, top = self._state
+        if (timestamps.max() - landmark) / self.half_life > self.MAX_EXPONENT:
+            # Rebase onto a new array; readers keep using the old one with its own landmark
+            values = values * np.exp2((landmark - timestamps.max()) / self.half_life)
+            landmark = float(timestamps.max())
+
+        size = int(book_ids.max()) + 1
+        if size > len(values):
+            grown = np.zeros(max(size, 2 * len(values)), dtype=np.float64)
+            grown[:len(values)] = values
+            values = grown
+
+        increments = np.exp2((timestamps - landmark) / self.half_life)
+        if weights is not None:
+            increments *= np.asarray(weights, dtype=np.float64)
+        # Counts only grow, so a reader of the published array at worst sees part of this batch
+        np.add.at(values, book_ids, increments)
+
+        candidates = np.union1d(top, book_ids)
+        if len(candidates) > self.capacity:
+            keep = np.argpartition(-values[candidates], self.capacity - 1)[:self.capacity]
+            candidates = candidates[keep]
+        self._state = (landmark, values, candidates)
+
+    def top_k(self, k, now=None):
+        """Return up to k (book_id, decayed count) pairs, highest first"""
+        now = time.time() if now is None else now
+        landmark, values, top = self._state
+        scores = values[top]
+        order = np.lexsort((top, -scores))[:k]
+        factor = np.exp2((landmark - now) / self.half_life)
+        return [(int(book_id), float(score * factor))
+                for book_id, score in zip(top[order], scores[order]) if score > 0]
+
+    def to_arrays(self, prefix):
+        return {
+            f'{prefix}values': self.values,
+            f'{prefix}top': self.top,
+            f'{prefix}landmark': np.asarray(self.landmark)
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix, half_life, capacity=Config.POPULARITY_TOP_K):
+        counter = cls(half_life, capacity)
+        counter._state = (float(arrays[f'{prefix}landmark']), arrays[f'{prefix}values'].astype(np.float64),
+                          arrays[f'{prefix}top'].astype(np.int64))
+        return counter
+
+
+class RatingEventLog:
+    """Append-only log of rating events, one line each: timestamp, user id, book id and rating, tab-separated"""
+
+    def __init__(self, path=Config.RATING_EVENT_LOG):
+        self.path = Path(path)
+
+    def append(self, book_id, user_id='', rating=0, timestamp=None):
+        """Append one event; a single short O_APPEND write keeps concurrent writers from interleaving"""
+        timestamp = time.time() if timestamp is None else timestamp
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(f"{timestamp:.3f}\t{user_id}\t{int(book_id)}\t{rating}\n")
+
+    def stat(self):
+        """Return (inode, size) of the log file, or (None, 0) if it does not exist yet"""
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None, 0
+        return stat.st_ino, stat.st_size
+
+    def read(self, offset, max_bytes=Config.RATING_LOG_CHUNK_BYTES):
+        """Return (book_ids, timestamps, next_offset) for complete lines after a byte offset"""
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            data = f.read(max_bytes)
+
+        # A partly written last line is left for the next read
+        end = data.rfind(b'\n') + 1
+        book_ids, timestamps = [], []
+        for line in data[:end].splitlines():
+            fields = line.split(b'\t')
+            try:
+                timestamp, book_id = float(fields[0]), int(fields[2])
+                if book_id < 0:
+                    raise ValueError(f"negative book id {book_id}")
+            except (ValueError, IndexError):
+                print(f"Skipping malformed rating event: {line[:80]!r}")
+                continue
+            timestamps.append(timestamp)
+            book_ids.append(book_id)
+        return np.asarray(book_ids, dtype=np.int64), np.asarray(timestamps, dtype=np.float64), offset + end
+
+
+class PopularityTracker:
+    """Popular and trending books from decayed counters fed by the rating event log
+
+    'popular' decays with POPULAR_HALF_LIFE and starts from the training
+    rating counts; 'trending' decays with TRENDING_HALF_LIFE and starts
+    empty. refresh() ingests the lines appended to the log since the last
+    call and, every POPULARITY_SNAPSHOT_INTERVAL seconds, saves the
+    counters with the log offset, so a restart only reads newer events.
+    Events for book ids outside the served catalogue (num_books) are dropped.
+    """
+
+    HALF_LIVES = {'popular': Config.POPULAR_HALF_LIFE, 'trending': Config.TRENDING_HALF_LIFE}
+
+    def __init__(self, seed_version, log=None, snapshot_path=None, num_books=None):
+        self.seed_version = seed_version
+        self.num_books = num_books
+        self.log = log if log is not None else RatingEventLog()
+        self.snapshot_path = Path(snapshot_path if snapshot_path is not None
+                                  else Config.MODELS_DIR / Config.POPULARITY_SNAPSHOT_FILE)
+        self.counters = {name: DecayedCounter(half_life) for name, half_life in self.HALF_LIVES.items()}
+        self.inode = None
+        self.offset = 0
+        self.events = 0
+        self._lock = threading.Lock()
+        self._last_poll = 0.0
+        self._last_snapshot = time.monotonic()
+
+    @classmethod
+    def open(cls, seed, seed_version, log=None, snapshot_path=None, num_books=None):
+        """Resume from the snapshot if it was seeded from the same models, else start from seed()
+
+        seed() returns (book_ids, counts) and is only called without a usable snapshot.
+        The first snapshot is written after POPULARITY_SNAPSHOT_INTERVAL, not on startup.
+        """
+        tracker = cls(seed_version, log, snapshot_path, num_books)
+        if tracker.load_snapshot():
+            tracker.refresh(force=True)
+            return tracker
+
+        book_ids, counts = seed()
+        book_ids = np.asarray(book_ids, dtype=np.int64)
+        if tracker.num_books is None:
+            tracker.num_books = int(book_ids.max()) + 1 if len(book_ids) else 0
+        tracker.counters['popular'].add(book_ids, np.full(len(book_ids), time.time()), weights=counts)
+        tracker.refresh(force=True)
+        return tracker
+
+    @property
+    def version(self):
+        """Changes whenever ingested events may have changed the rankings"""
+        return f'{self.seed_version}:{self.events}'
+
+    def refresh(self, force=False):
+        """Ingest newly appended events, at most once per POPULARITY_POLL_INTERVAL unless forced"""
+        if not force and time.monotonic() - self._last_poll < Config.POPULARITY_POLL_INTERVAL:
+            return 0
+        if not self._lock.acquire(blocking=force):
+            # Another thread is already ingesting
+            return 0
+
+        try:
+            self._last_poll = time.monotonic()
+            inode, size = self.log.stat()
+            if inode != self.inode or size < self.offset:
+                # A new or rotated log only holds events that have not been counted
+                if self.offset:
+                    print(f"Rating event log {self.log.path} was rotated; reading it from the start")
+                self.inode, self.offset = inode, 0
+
+            ingested = 0
+            while self.offset < size:
+                book_ids, timestamps, offset = self.log.read(self.offset)
+                if offset == self.offset:
+                    break
+                if self.num_books is not None:
+                    served = book_ids < self.num_books
+                    if not served.all():
+                        print(f"Skipping {int((~served).sum())} rating events for book ids outside the catalogue")
+                        book_ids, timestamps = book_ids[served], timestamps[served]
+                for counter in self.counters.values():
+                    counter.add(book_ids, timestamps)
+                self.offset = offset
+                ingested += len(book_ids)
+            self.events += ingested
+
+            if time.monotonic() - self._last_snapshot >= Config.POPULARITY_SNAPSHOT_INTERVAL:
+                self.save_snapshot()
+            return ingested
+        finally:
+            self._lock.release()
+
+    def top(self, name, limit):
+        """Return up to limit (book_id, decayed count) pairs of the 'popular' or 'trending' counter"""
+        self.refresh()
+        return self.counters[name].top_k(limit)
+
+    def popular(self, limit):
+        return self.top('popular', limit)
+
+    def trending(self, limit):
+        return self.top('trending', limit)
+
+    def save_snapshot(self):
+        """Write the counters and the log offset atomically"""
+        self._last_snapshot = time.monotonic()
+        meta = {'seed_version': self.seed_version, 'inode': self.inode, 'offset': self.offset,
+                'events': self.events, 'log': str(self.log.path), 'half_lives': self.HALF_LIVES,
+                'num_books': self.num_books}
+        arrays = {}
+        for name, counter in self.counters.items():
+            arrays.update(counter.to_arrays(f'{name}_'))
+
+        try:
+            # Per process, so several workers saving at once never write the same temp file
+            temp_path = self.snapshot_path.with_name(f'{self.snapshot_path.stem}.{os.getpid()}.tmp.npz')
+            np.savez(temp_path, meta=np.asarray(json.dumps(meta)), **arrays)
+            os.replace(temp_path, self.snapshot_path)
+        except Exception as e:
+            print(f"Error saving popularity snapshot: {e}")
+
+    def load_snapshot(self):
+        """Restore the counters from the snapshot if it matches the models, log path and half-lives"""
+        if not self.snapshot_path.exists():
+            return False
+
+        try:
+            with np.load(self.snapshot_path, allow_pickle=False) as data:
+                arrays = {name: data[name] for name in data.files if name != 'meta'}
+                meta = json.loads(str(data['meta']))
+        except Exception as e:
+            print(f"Ignoring unreadable popularity snapshot: {e}")
+            return False
+
+        if (meta['seed_version'] != self.seed_version or meta['log'] != str(self.log.path) or
+                meta['half_lives'] != self.HALF_LIVES):
+            print("Popularity snapshot is stale; rebuilding from the training counts and the full log")
+            return False
+
+        self.counters = {name: DecayedCounter.from_arrays(arrays, f'{name}_', half_life)
+                         for name, half_life in self.HALF_LIVES.items()}
+        self.inode, self.offset = meta['inode'], meta['offset']
+        self.events = meta['events']
+        if self.num_books is None:
+            self.num_books = meta.get('num_books')
+        return True
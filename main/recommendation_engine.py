@@ -1,27 +1,58 @@
+import time
 from data_loader import DataLoader
 from data_preprocessor import DataPreprocessor
 from collaborative_model import CollaborativeFilteringModel
 from content_model import ContentBasedModel
 from hybrid_model import HybridRecommendationModel
 from model_manager import ModelManager
+from evaluator import ModelEvaluator
+from title_resolver import TitleResolver
+from stage_cache import StageCache
+from catalogue_store import CatalogueStore
+from cold_start import ColdStartFallbacks
 from config import Config
 
 class RecommendationEngine:
     
+    # Source files and Config values each training stage depends on; both go into its stage key
+    STAGE_SOURCES = {
+        'preprocess': ['data_loader.py', 'data_preprocessor.py'],
+        'collaborative': ['collaborative_model.py'],
+        'content': ['content_model.py', 'hashed_content_index.py'],
+        'save': ['serving_artifact.py', 'catalogue_store.py', 'cold_start.py', 'model_manager.py', 'title_resolver.py']
+    }
+    STAGE_CONFIG = {
+        'preprocess': ['MIN_USER_RATINGS', 'MIN_BOOK_RATINGS'],
+        'collaborative': [],
+        'content': ['CONTENT_INDEX_MODE', 'TFIDF_MAX_FEATURES', 'HASHED_FEATURES', 'SERVING_NEIGHBORS'],
+        'save': ['SERVING_NEIGHBORS', 'COLD_START_FALLBACKS', 'ARTIFACT_QUANTIZE', 'ARTIFACT_SCORE_BITS',
+                 'QUANTIZE_MIN_OVERLAP', 'QUANTIZE_MAX_SCORE_ERROR', 'QUANTIZE_CHECK_TOP_N', 'QUANTIZE_CHECK_SAMPLE']
+    }
+    
     def __init__(self):
         self.cf_model = None
         self.cb_model = None
         self.hybrid_model = None
         self.processed_data = None
+        self.title_resolver = None
+        self.resolver_book_ids = None
+        self.cold_start = None
         self.model_manager = ModelManager()
         self.is_trained = False
     
-    def train_models(self):
-        """Train all recommendation models"""
-        print("="*60)
-        print("Starting model training...")
-        print("="*60)
-        
+    @staticmethod
+    def _source(filename):
+        """Path of a pipeline source file, hashed into stage keys so code changes invalidate them"""
+        return Config.BASE_DIR / 'main' / filename
+    
+    @classmethod
+    def stage_key(cls, cache, stage, upstream=()):
+        """Key of a training stage from its upstream inputs, its source files and its Config values"""
+        inputs = list(upstream) + [cls._source(filename) for filename in cls.STAGE_SOURCES[stage]]
+        return cache.key(stage, inputs, cls.STAGE_CONFIG[stage])
+    
+    def _load_and_preprocess(self):
+        """Load the raw data and run the preprocessing pipeline"""
         # Load data
         print("\n1. Loading data...")
         books = DataLoader.load_books()
@@ -30,43 +61,111 @@ class RecommendationEngine:
         
         if any(data is None for data in [books, users, ratings]):
             print("Failed to load data")
-            return False
+            return None
         
         # Preprocess data
         print("\n2. Preprocessing data...")
         preprocessor = DataPreprocessor(books, users, ratings)
+        preprocessor.assign_book_ids()
         preprocessor.filter_active_users()
         preprocessor.merge_ratings_with_books()
         preprocessor.filter_popular_books()
         preprocessor.prepare_content_features()
         
-        self.processed_data = preprocessor.get_processed_data()
+        return preprocessor.get_processed_data()
+    
+    def _cached_preprocess(self, cache):
+        """Run the load and preprocessing stages through the stage cache"""
+        data_files = [Config.DATA_DIR / Config.BOOKS_FILE,
+                      Config.DATA_DIR / Config.USERS_FILE,
+                      Config.DATA_DIR / Config.RATINGS_FILE]
+        return cache.run('preprocess', self._load_and_preprocess, self.stage_key(cache, 'preprocess', data_files))
+    
+    def train_models(self):
+        """Train all recommendation models, reusing unchanged stages from the stage cache"""
+        print("="*60)
+        print("Starting model training...")
+        print("="*60)
+        
+        cache = StageCache()
+        preprocess_key, self.processed_data = self._cached_preprocess(cache)
+        if self.processed_data is None:
+            return False
+        
+        def train(model, data):
+            model.train(data)
+            return model if model.is_trained else None
         
         # Train collaborative filtering model
         print("\n3. Training collaborative filtering model...")
-        self.cf_model = CollaborativeFilteringModel()
-        self.cf_model.train(self.processed_data['final_rating'])
+        cf_key, self.cf_model = cache.run(
+            'collaborative',
+            lambda: train(CollaborativeFilteringModel(), self.processed_data['final_rating']),
+            self.stage_key(cache, 'collaborative', [preprocess_key]))
         
         # Train content-based model
         print("\n4. Training content-based model...")
-        self.cb_model = ContentBasedModel()
-        self.cb_model.train(self.processed_data['books_content'])
+        cb_key, self.cb_model = cache.run(
+            'content',
+            lambda: train(ContentBasedModel(), self.processed_data['books_content']),
+            self.stage_key(cache, 'content', [preprocess_key]))
+        
+        if self.cf_model is None or self.cb_model is None:
+            print("Failed to train models")
+            cache.print_summary()
+            return False
         
         # Create hybrid model
         print("\n5. Creating hybrid model...")
         self.hybrid_model = HybridRecommendationModel(self.cf_model, self.cb_model)
         
-        # Save models
+        # Save models, unless the models directory already holds exactly these
         print("\n6. Saving models...")
-        if self.model_manager.save_models(self.cf_model, self.cb_model, self.processed_data):
-            self.is_trained = True
-            print("\n" + "="*60)
-            print("Model training completed successfully!")
-            print("="*60)
-            return True
+        save_key = self.stage_key(cache, 'save', [cb_key, cf_key])
+        start = time.perf_counter()
+        if self.model_manager.saved_stage_key() == save_key and self.model_manager.models_exist():
+            print(f"Saved models are up to date ({save_key})")
+            self.processed_data['catalogue'] = CatalogueStore.open(Config.MODELS_DIR / CatalogueStore.DIRNAME)
+            cache.record('save', save_key, True, time.perf_counter() - start)
         else:
-            print("Failed to save models")
+            self.model_manager.write_stage_key(None)
+            self.processed_data['catalogue'] = self.model_manager.save_catalogue(self.processed_data['books'])
+            if self.processed_data['catalogue'] is None:
+                print("Failed to save catalogue")
+                return False
+            
+            if not self.model_manager.save_models(self.cf_model, self.cb_model, self.processed_data):
+                print("Failed to save models")
+                return False
+            self.model_manager.write_stage_key(save_key)
+            cache.record('save', save_key, False, time.perf_counter() - start)
+        
+        self._build_title_resolver()
+        self._build_cold_start()
+        self.is_trained = True
+        cache.print_summary()
+        print("\n" + "="*60)
+        print("Model training completed successfully!")
+        print("="*60)
+        return True
+    
+    def export_serving_artifact(self, quantize=Config.ARTIFACT_QUANTIZE):
+        """Export the serving-only artifact from the loaded models"""
+        if not self.is_trained:
+            print("Models not trained or loaded. Please train or load models first.")
             return False
+        
+        return self.model_manager.export_serving_artifact(self.cf_model, self.cb_model, self.processed_data,
+                                                          quantize=quantize)
+    
+    def evaluate_models(self, k=Config.EVAL_K, workers=Config.EVAL_WORKERS):
+        """Evaluate all methods offline on a per-user train/test split"""
+        _, processed_data = self._cached_preprocess(StageCache())
+        if processed_data is None:
+            return None
+        
+        evaluator = ModelEvaluator(processed_data, k=k, workers=workers)
+        return evaluator.evaluate()
     
     def load_trained_models(self):
         """Load pre-trained models"""
@@ -85,8 +184,10 @@ class RecommendationEngine:
             self.processed_data = {
                 'books_content': loaded_data['books_content'],
                 'final_rating': loaded_data['final_rating'],
-                'books': loaded_data['books']
+                'catalogue': loaded_data['catalogue']
             }
+            self._build_title_resolver()
+            self._build_cold_start()
             self.is_trained = True
             print("Models loaded successfully!")
             return True
@@ -94,36 +195,154 @@ class RecommendationEngine:
         print("Failed to load models")
         return False
     
+    def _build_title_resolver(self):
+        """Build the seed title resolver over the trained books"""
+        books_content = self.processed_data['books_content']
+        counts = self.processed_data['final_rating'].groupby('book_id')['rating'].count()
+        self.resolver_book_ids = books_content['book_id'].tolist()
+        popularity = counts.reindex(self.resolver_book_ids, fill_value=0).tolist()
+        self.title_resolver = TitleResolver(books_content['title'].tolist(), popularity=popularity)
+    
+    def add_book(self, book_id, content_features=None):
+        """Add or update one catalogue book in the content index without retraining"""
+        if not self.is_trained:
+            print("Models not trained or loaded. Please train or load models first.")
+            return False
+        
+        catalogue = self.processed_data['catalogue']
+        if book_id not in catalogue:
+            print(f"Book id {book_id} not found in catalogue")
+            return False
+        
+        book = catalogue.get(book_id)
+        if content_features is None:
+            content_features = DataPreprocessor.content_features_for(book)
+        
+        is_new = self.cb_model.rows_of([book_id])[0] < 0
+        if not self.cb_model.add_book(book_id, content_features):
+            return False
+        
+        # New books become resolvable as content-based seeds
+        if is_new:
+            self.title_resolver.add(book['title'])
+            self.resolver_book_ids.append(int(book_id))
+        return True
+    
+    def compact_content_index(self):
+        """Refresh IDF weights of the hashed content index after incremental adds"""
+        if not self.is_trained:
+            print("Models not trained or loaded. Please train or load models first.")
+            return False
+        
+        self.cb_model.compact()
+        return True
+    
+    def _build_cold_start(self):
+        """Precompute author and publisher fallbacks for books outside the collaborative model"""
+        counts = self.processed_data['final_rating'].groupby('book_id')['rating'].count()
+        book_ids = self.cf_model.book_pivot.index
+        self.cold_start = ColdStartFallbacks.build(book_ids, counts.reindex(book_ids, fill_value=0).to_numpy(),
+                                                   self.processed_data['catalogue'])
+    
+    def resolve_book(self, query):
+        """Resolve free text (any case, punctuation, missing subtitle, typos) to a (book_id, title) pair"""
+        if not self.is_trained or self.title_resolver is None:
+            return None
+        
+        resolved = self.title_resolver.resolve(query)
+        if resolved is not None and resolved[2] == 1.0:
+            return int(self.resolver_book_ids[resolved[0]]), resolved[1]
+        
+        # An exact title anywhere in the catalogue beats a fuzzy trained match
+        found = self.processed_data['catalogue'].find_title(query) if isinstance(query, str) else None
+        if found is not None:
+            return found
+        
+        if resolved is None:
+            return None
+        row, title, _ = resolved
+        return int(self.resolver_book_ids[row]), title
+    
+    def resolve_title(self, query):
+        """Resolve free text to a catalogue title"""
+        resolved = self.resolve_book(query)
+        return resolved[1] if resolved else None
+    
     def get_recommendations(self, book_title, method='hybrid', top_n=Config.DEFAULT_TOP_N):
         """Get recommendations using specified method"""
         if not self.is_trained:
             print("Models not trained or loaded. Please train or load models first.")
             return []
         
+        resolved = self.resolve_book(book_title)
+        if resolved is None:
+            print(f"Book '{book_title}' not found")
+            return []
+        book_id = resolved[0]
+        catalogue = self.processed_data['catalogue']
+        
         if method == 'collaborative':
-            return self.cf_model.get_recommendations(
-                book_title, 
-                self.processed_data['books_content'],
-                self.processed_data['books'],
-                top_n
-            )
+            return self._collaborative_candidates(book_id, top_n)
         elif method == 'content':
-            return self.cb_model.get_recommendations(
-                book_title,
-                self.processed_data['books_content'],
-                top_n
-            )
+            return self.cb_model.get_recommendations(book_id, catalogue, top_n)
         elif method == 'hybrid':
-            return self.hybrid_model.get_recommendations(
-                book_title,
-                self.processed_data['books_content'],
-                self.processed_data['books'],
-                top_n=top_n
-            )
+            if book_id in self.cf_model.id_to_row.index:
+                return self.hybrid_model.get_recommendations(book_id, catalogue, top_n=top_n)
+            return HybridRecommendationModel.combine(self._collaborative_candidates(book_id, top_n*2),
+                                                     self.cb_model.get_recommendations(book_id, catalogue, top_n*2),
+                                                     top_n=top_n)
         else:
             print("Invalid method. Use 'collaborative', 'content', or 'hybrid'")
             return []
     
+    def get_all_recommendations(self, book_title, top_n=Config.DEFAULT_TOP_N):
+        """Get collaborative, content and hybrid recommendations from one pass over each model"""
+        if not self.is_trained:
+            print("Models not trained or loaded. Please train or load models first.")
+            return {}
+        
+        resolved = self.resolve_book(book_title)
+        if resolved is None:
+            print(f"Book '{book_title}' not found")
+            return {}
+        book_id = resolved[0]
+        catalogue = self.processed_data['catalogue']
+        
+        # The hybrid list needs top_n*2 candidates per branch; the single-method
+        # lists are their top_n prefixes
+        cf_recs = self._collaborative_candidates(book_id, top_n*2)
+        cb_recs = self.cb_model.get_recommendations(book_id, catalogue, top_n*2)
+        
+        return {
+            'collaborative': cf_recs[:top_n],
+            'content': cb_recs[:top_n],
+            'hybrid': HybridRecommendationModel.combine(cf_recs, cb_recs, top_n=top_n)
+        }
+    
+    def _collaborative_candidates(self, book_id, top_n):
+        """Collaborative recommendations, or popular books by the same author or publisher for untrained books"""
+        catalogue = self.processed_data['catalogue']
+        if book_id in self.cf_model.id_to_row.index or self.cold_start is None or book_id not in catalogue:
+            return self.cf_model.get_recommendations(book_id, catalogue, top_n)
+        
+        book_ids = self.cf_model.book_pivot.index
+        recommendations = []
+        for position, (item, tier) in enumerate(self.cold_start.lookup(book_id, catalogue, top_n)):
+            book_info = catalogue.get(int(book_ids[item]))
+            recommendations.append({
+                'book_id': book_info['book_id'],
+                'title': book_info['title'],
+                'author': book_info['author'],
+                'year': book_info['year'],
+                'publisher': book_info['publisher'],
+                'image_url': self.cf_model._validate_image_url(book_info['img_url']),
+                # Scores only keep the fallback order
+                'score': self.cold_start.score(position),
+                'type': 'collaborative',
+                'fallback': tier
+            })
+        return recommendations
+    
     def get_available_books(self, limit=None):
         """Get list of all available books for recommendations"""
         if not self.is_trained:
@@ -142,11 +361,12 @@ class RecommendationEngine:
             return []
         
         books = self.processed_data['books_content']
-        matching_books = books[books['title'].str.contains(query, case=False, na=False)]
+        matching_books = books[books['title'].str.contains(query, case=False, na=False, regex=False)]
         
         results = []
         for _, book in matching_books.head(limit).iterrows():
             results.append({
+                'book_id': int(book['book_id']),
                 'title': book['title'],
                 'author': book['author'],
                 'year': book['year'],
@@ -160,15 +380,14 @@ class RecommendationEngine:
         if not self.is_trained:
             return None
         
-        book_info = self.processed_data['books_content'][
-            self.processed_data['books_content']['title'] == book_title
-        ]
-        
-        if book_info.empty:
+        resolved = self.resolve_book(book_title)
+        if resolved is None:
             return None
         
-        book = book_info.iloc[0]
+        book = self.processed_data['catalogue'].get(resolved[0])
         return {
+            'book_id': resolved[0],
+            'isbn': book['isbn'],
             'title': book['title'],
             'author': book['author'],
             'year': book['year'],
@@ -0,0 +1,67 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+
+
+class ServerOverloaded(Exception):
+    """Raised when too many distinct computations are already pending"""
+
+
+class RequestCoalescer:
+    """Single-flight execution of identical requests on a bounded executor
+
+    Concurrent calls with the same key share one computation, so callers
+    must treat results as read-only. Distinct computations run on a fixed
+    thread pool; once max_pending of them are queued or running, new keys
+    are rejected with ServerOverloaded instead of waiting in line.
+    """
+
+    def __init__(self, workers=Config.SERVING_WORKERS, max_pending=Config.SERVING_MAX_PENDING):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='recommend')
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self.stats = {'computed': 0, 'coalesced': 0, 'rejected': 0}
+
+    @property
+    def pending(self):
+        """Number of distinct computations queued or running"""
+        return len(self._in_flight)
+
+    def submit(self, key, fn, *args, **kwargs):
+        """Return a future for fn(*args, **kwargs), shared by all concurrent callers with the same key"""
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.stats['coalesced'] += 1
+                return future
+
+            if len(self._in_flight) >= self.max_pending:
+                self.stats['rejected'] += 1
+                raise ServerOverloaded(f"{len(self._in_flight)} requests pending")
+
+            future = self.executor.submit(fn, *args, **kwargs)
+            self._in_flight[key] = future
+            self.stats['computed'] += 1
+
+        future.add_done_callback(lambda done: self._release(key, done))
+        return future
+
+    def _release(self, key, future):
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+    def call(self, key, fn, *args, **kwargs):
+        """Blocking version of run()"""
+        return self.submit(key, fn, *args, **kwargs).result()
+
+    async def run(self, key, fn, *args, **kwargs):
+        """Await the shared result of fn(*args, **kwargs) from any event loop"""
+        future = asyncio.wrap_future(self.submit(key, fn, *args, **kwargs))
+        # A cancelled caller must not cancel the computation other callers share
+        return await asyncio.shield(future)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
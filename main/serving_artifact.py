@@ -0,0 +1,368 @@
+import hashlib
+import json
+import time
+import numpy as np
+from config import Config
+from cold_start import ColdStartFallbacks
+
+# Only NumPy is imported here so that serving processes can load the
+# artifact without pulling in pandas, SciPy or scikit-learn. The other
+# serving-side modules (catalogue_store, cold_start, popularity) follow
+# the same rule.
+
+
+def _top_k_rows(similarity, k, offset=0):
+    """Return the top-k column indices and scores per row, excluding self matches"""
+    similarity = np.array(similarity, dtype=np.float32)
+    rows = np.arange(similarity.shape[0])
+    self_cols = rows + offset
+    in_range = self_cols < similarity.shape[1]
+    similarity[rows[in_range], self_cols[in_range]] = -np.inf
+
+    k = min(k, similarity.shape[1] - 1)
+    if k <= 0:
+        empty = np.full((similarity.shape[0], 0), -1, dtype=np.int32)
+        return empty, np.zeros(empty.shape, dtype=np.float32)
+
+    top = np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(similarity, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    top = np.take_along_axis(top, order, axis=1).astype(np.int32)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+    # Pad slots that had no valid neighbor
+    invalid = ~np.isfinite(top_scores)
+    top[invalid] = -1
+    top_scores[invalid] = 0.0
+    return top, top_scores
+
+
+def _exact_similarities(cf_model, cb_model, book_ids, rows):
+    """Float64 collaborative and content similarities of some artifact rows against all rows"""
+    item_vectors = np.asarray(cf_model.book_pivot.values, dtype=np.float64)
+    norms = np.linalg.norm(item_vectors, axis=1, keepdims=True)
+    item_vectors = item_vectors / np.where(norms > 0, norms, 1.0)
+    cf = item_vectors[rows] @ item_vectors.T
+
+    positions = cb_model.rows_of(book_ids)
+    cb = np.full(cf.shape, -np.inf)
+    content_rows = np.where(positions[rows] >= 0)[0]
+    content_cols = np.where(positions >= 0)[0]
+    if len(content_rows) and len(content_cols):
+        block = np.asarray(cb_model.similarity(positions[rows[content_rows]], positions[content_cols]), dtype=np.float64)
+        cb[np.ix_(content_rows, content_cols)] = block
+
+    self_match = (np.arange(len(rows)), rows)
+    cf[self_match] = -np.inf
+    cb[self_match] = -np.inf
+    return {'collaborative': cf, 'content': cb}
+
+
+def _top_n_agreement(ids, exact_score, exact_scores, top_n, tolerance=1e-5):
+    """Share of results whose exact score reaches the exact n-th best score; ties at the cut-off count"""
+    best = np.sort(np.asarray([score for score in exact_scores if np.isfinite(score)]))[::-1][:top_n]
+    expected = max(len(best), len(ids))
+    if expected == 0:
+        return 1.0
+    if len(best) == 0:
+        return 0.0
+    hits = sum(1 for neighbor in ids if exact_score(neighbor) >= best[-1] - tolerance)
+    return hits / expected
+
+
+def _digest(arrays):
+    """Content hash of a set of arrays, used as the model version"""
+    digest = hashlib.sha1()
+    for name in sorted(arrays):
+        digest.update(name.encode())
+        digest.update(np.ascontiguousarray(arrays[name]).tobytes())
+    return digest.hexdigest()[:16]
+
+
+class ServingArtifact:
+    """Serving-only export of the trained models: neighbor tables and book metadata as plain arrays"""
+
+    FILENAME = 'serving_artifact.npz'
+
+    # String fields; quantized artifacts store them as UTF-8 bytes
+    TEXT_FIELDS = ('isbns', 'titles', 'authors', 'publishers', 'img_urls')
+    # Neighbor slots without a neighbor in narrowed (uint16) neighbor tables
+    NO_NEIGHBOR = np.iinfo(np.uint16).max
+    
+    def __init__(self, arrays, meta):
+        self.arrays = arrays
+        self.meta = meta
+        self.book_ids = arrays['book_ids']
+        self.titles = arrays['titles']
+        if self.titles.dtype.kind == 'S':
+            self.titles = np.char.decode(self.titles, 'utf-8')
+        self._lower_titles = None
+        self.cold_start = ColdStartFallbacks.from_arrays(arrays)
+
+    @property
+    def model_version(self):
+        return self.meta['model_version']
+
+    @classmethod
+    def build(cls, cf_model, cb_model, processed_data, top_k=Config.SERVING_NEIGHBORS):
+        """Precompute neighbor tables from trained models"""
+        catalogue = processed_data['catalogue']
+        final_rating = processed_data['final_rating']
+
+        # Pivot rows are sorted by book id
+        book_ids = cf_model.book_pivot.index.to_numpy(dtype=np.int32)
+        num_items = len(book_ids)
+        books = [catalogue.get(int(book_id)) for book_id in book_ids]
+
+        def as_text(field):
+            return np.asarray([book[field] for book in books], dtype=str)
+
+        arrays = {
+            'book_ids': book_ids,
+            'isbns': as_text('isbn'),
+            'titles': as_text('title'),
+            'authors': as_text('author'),
+            'publishers': as_text('publisher'),
+            'years': np.asarray([book['year'] for book in books], dtype=np.int32),
+            'img_urls': as_text('img_url')
+        }
+
+        # Collaborative neighbors from cosine similarity of the pivot rows
+        item_vectors = np.asarray(cf_model.book_pivot.values, dtype=np.float32)
+        norms = np.linalg.norm(item_vectors, axis=1, keepdims=True)
+        item_vectors = item_vectors / np.where(norms > 0, norms, 1.0)
+
+        cf_neighbors, cf_scores = [], []
+        for start in range(0, num_items, Config.SERVING_BLOCK_SIZE):
+            block = item_vectors[start:start + Config.SERVING_BLOCK_SIZE] @ item_vectors.T
+            neighbors, scores = _top_k_rows(block, top_k, offset=start)
+            cf_neighbors.append(neighbors)
+            cf_scores.append(scores)
+        arrays['cf_neighbors'] = np.vstack(cf_neighbors)
+        arrays['cf_scores'] = np.vstack(cf_scores)
+
+        # Content neighbors from the content similarity matrix, remapped onto pivot rows
+        positions = cb_model.rows_of(book_ids)
+        cb_neighbors = np.full((num_items, arrays['cf_neighbors'].shape[1]), -1, dtype=np.int32)
+        cb_scores = np.zeros(cb_neighbors.shape, dtype=np.float32)
+        content_rows = np.where(positions >= 0)[0]
+        for start in range(0, len(content_rows), Config.SERVING_BLOCK_SIZE):
+            rows = content_rows[start:start + Config.SERVING_BLOCK_SIZE]
+            block = np.full((len(rows), num_items), -np.inf, dtype=np.float32)
+            block[:, content_rows] = cb_model.similarity(positions[rows], positions[content_rows])
+            block[np.arange(len(rows)), rows] = -np.inf
+            neighbors, scores = _top_k_rows(block, top_k, offset=num_items)
+            cb_neighbors[rows, :neighbors.shape[1]] = neighbors
+            cb_scores[rows, :scores.shape[1]] = scores
+        arrays['cb_neighbors'] = cb_neighbors
+        arrays['cb_scores'] = cb_scores
+
+        # Homepage popularity ranking
+        counts = final_rating.groupby('book_id')['rating'].count()
+        num_ratings = counts.reindex(book_ids, fill_value=0).to_numpy(dtype=np.int32)
+        arrays['num_ratings'] = num_ratings
+        arrays['popular'] = np.argsort(-num_ratings, kind='stable').astype(np.int32)
+        
+        # Fallbacks for catalogue books that are not served, as artifact rows
+        arrays.update(ColdStartFallbacks.build(book_ids, num_ratings, catalogue).to_arrays())
+
+        meta = {
+            'model_version': _digest(arrays),
+            'created_at': int(time.time()),
+            'num_items': num_items,
+            'top_k': int(arrays['cf_neighbors'].shape[1])
+        }
+        return cls(arrays, meta)
+
+    def quantize(self, score_bits=Config.ARTIFACT_SCORE_BITS):
+        """Return a smaller copy: per-row scaled integer scores, narrow neighbor ids, UTF-8 strings"""
+        if not 1 <= score_bits <= 16:
+            raise ValueError(f"score_bits must be between 1 and 16, got {score_bits}")
+        score_dtype = np.uint8 if score_bits <= 8 else np.uint16
+        levels = (1 << score_bits) - 1
+        arrays = dict(self.arrays)
+        
+        for prefix in ('cf', 'cb'):
+            neighbors = self.arrays[f'{prefix}_neighbors']
+            scores = self.arrays[f'{prefix}_scores'].astype(np.float32)
+            
+            # Each row is scaled by its largest score, so rows keep their full resolution
+            scales = np.abs(scores).max(axis=1) if scores.shape[1] else np.zeros(len(scores), dtype=np.float32)
+            scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+            quantized = np.rint(np.clip(scores / scales[:, None], 0.0, 1.0) * levels)
+            arrays[f'{prefix}_scores'] = quantized.astype(score_dtype)
+            arrays[f'{prefix}_score_scales'] = scales
+            
+            if len(self.book_ids) < self.NO_NEIGHBOR:
+                arrays[f'{prefix}_neighbors'] = np.where(neighbors >= 0, neighbors, self.NO_NEIGHBOR).astype(np.uint16)
+        
+        arrays['years'] = self.arrays['years'].astype(np.int16)
+        for name in self.TEXT_FIELDS:
+            if self.arrays[name].dtype.kind == 'U':
+                arrays[name] = np.char.encode(self.arrays[name], 'utf-8')
+        
+        meta = dict(self.meta, model_version=_digest(arrays), score_bits=score_bits)
+        return ServingArtifact(arrays, meta)
+    
+    def shard(self, index, num_shards):
+        """Return the part of the artifact owned by one shard: books with book_id % num_shards == index
+
+        Neighbor tables of a shard hold global book ids instead of rows, since
+        neighbors usually live on other shards.
+        """
+        rows = np.where(self.book_ids % num_shards == index)[0]
+        arrays = {}
+        for name in ('book_ids', 'years', 'num_ratings') + self.TEXT_FIELDS:
+            arrays[name] = self.arrays[name][rows]
+        
+        for prefix in ('cf', 'cb'):
+            neighbors = self.arrays[f'{prefix}_neighbors'][rows]
+            if neighbors.dtype == np.uint16:
+                valid = neighbors != self.NO_NEIGHBOR
+            else:
+                valid = neighbors >= 0
+            book_ids = self.book_ids[np.where(valid, neighbors, 0)]
+            arrays[f'{prefix}_neighbors'] = np.where(valid, book_ids, -1).astype(np.int32)
+            arrays[f'{prefix}_scores'] = self.arrays[f'{prefix}_scores'][rows]
+            if f'{prefix}_score_scales' in self.arrays:
+                arrays[f'{prefix}_score_scales'] = self.arrays[f'{prefix}_score_scales'][rows]
+        
+        arrays['popular'] = np.argsort(-arrays['num_ratings'], kind='stable').astype(np.int32)
+        
+        # Every shard keeps the fallback lists, as book ids, for the unserved books it owns
+        if self.cold_start is not None:
+            for name, array in self.cold_start.to_arrays().items():
+                arrays[name] = self.book_ids[array].astype(np.int32) if name.endswith('_items') else array
+        
+        meta = dict(self.meta, num_items=len(rows), shard=index, num_shards=num_shards)
+        return ServingArtifact(arrays, meta)
+    
+    @staticmethod
+    def shard_filename(index, num_shards):
+        return f'serving_shard_{index}_of_{num_shards}.npz'
+    
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.arrays.values())
+    
+    def save(self, path):
+        """Write the artifact as a single uncompressed .npz file"""
+        np.savez(path, meta=np.asarray(json.dumps(self.meta)), **self.arrays)
+
+    @classmethod
+    def load(cls, path):
+        """Load an artifact written by save()"""
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files if name != 'meta'}
+            meta = json.loads(str(data['meta']))
+        return cls(arrays, meta)
+
+    def row_of(self, book_id):
+        """Return the artifact row of a book id, or None if it is not served"""
+        row = int(np.searchsorted(self.book_ids, book_id))
+        if row < len(self.book_ids) and self.book_ids[row] == book_id:
+            return row
+        return None
+
+    def neighbors(self, method, row, top_n):
+        """Return up to top_n (row, score) pairs for the given method; shards return book ids"""
+        prefix = 'cf' if method == 'collaborative' else 'cb'
+        neighbors = self.arrays[f'{prefix}_neighbors'][row, :top_n]
+        scores = self.arrays[f'{prefix}_scores'][row, :top_n]
+        if neighbors.dtype == np.uint16:
+            valid = neighbors != self.NO_NEIGHBOR
+        else:
+            valid = neighbors >= 0
+        
+        scales = self.arrays.get(f'{prefix}_score_scales')
+        if scales is not None:
+            scores = scores.astype(np.float32) * (scales[row] / ((1 << self.meta['score_bits']) - 1))
+        return list(zip(neighbors[valid].tolist(), scores[valid].tolist()))
+    
+    def fallback_neighbors(self, book_id, catalogue, top_n):
+        """Return up to top_n (row, score) pairs for a catalogue book that is not served; shards return book ids"""
+        if self.cold_start is None or not self.cold_start.matches(catalogue) or book_id not in catalogue:
+            return []
+        fallbacks = self.cold_start.lookup(book_id, catalogue, top_n)
+        # Scores only keep the tier order; the hybrid merge of two identical lists preserves it
+        return [(row, self.cold_start.score(position)) for position, (row, _) in enumerate(fallbacks)]
+    
+    def hybrid_neighbors(self, row, top_n, cf_weight=Config.HYBRID_CF_WEIGHT, cb_weight=Config.HYBRID_CB_WEIGHT):
+        """Return up to top_n (row, score) pairs merging both neighbor lists the way the app does"""
+        combined = {}
+        for neighbor, score in self.neighbors('collaborative', row, top_n * 2):
+            combined[neighbor] = score * cf_weight
+        for neighbor, score in self.neighbors('content', row, top_n * 2):
+            combined[neighbor] = combined.get(neighbor, 0.0) + score * cb_weight
+        return sorted(combined.items(), key=lambda item: item[1], reverse=True)[:top_n]
+    
+    def exact_agreement(self, cf_model, cb_model, top_n=Config.QUANTIZE_CHECK_TOP_N,
+                        sample=Config.QUANTIZE_CHECK_SAMPLE):
+        """Check served results against exact float64 scores recomputed from the models
+
+        Returns ({method: mean top-n agreement}, largest neighbor score error).
+        Hybrid results are checked against the same merge over exact lists.
+        """
+        num_items = len(self.book_ids)
+        rows = np.arange(num_items)
+        if sample and num_items > sample:
+            rows = np.sort(np.random.default_rng(Config.EVAL_RANDOM_STATE).choice(num_items, sample, replace=False))
+        
+        totals = {'collaborative': 0.0, 'content': 0.0, 'hybrid': 0.0}
+        max_error = 0.0
+        weights = {'collaborative': Config.HYBRID_CF_WEIGHT, 'content': Config.HYBRID_CB_WEIGHT}
+        for start in range(0, len(rows), Config.SERVING_BLOCK_SIZE):
+            block_rows = rows[start:start + Config.SERVING_BLOCK_SIZE]
+            exact = _exact_similarities(cf_model, cb_model, self.book_ids, block_rows)
+            
+            for i, row in enumerate(block_rows.tolist()):
+                hybrid = {}
+                for method, weight in weights.items():
+                    sims = exact[method][i]
+                    served = self.neighbors(method, row, top_n)
+                    totals[method] += _top_n_agreement([n for n, _ in served], sims.__getitem__, sims, top_n)
+                    for neighbor, score in served:
+                        max_error = max(max_error, abs(score - sims[neighbor]))
+                    
+                    candidates = np.argsort(-sims, kind='stable')[:top_n * 2]
+                    for neighbor in candidates[np.isfinite(sims[candidates])].tolist():
+                        hybrid[neighbor] = hybrid.get(neighbor, 0.0) + sims[neighbor] * weight
+                
+                served = [n for n, _ in self.hybrid_neighbors(row, top_n)]
+                totals['hybrid'] += _top_n_agreement(served, lambda n: hybrid.get(n, -np.inf),
+                                                     list(hybrid.values()), top_n)
+        
+        return {method: total / max(len(rows), 1) for method, total in totals.items()}, max_error
+
+    def book_info(self, row):
+        """Return the metadata of one book as a dict"""
+        return {
+            'book_id': int(self.book_ids[row]),
+            'isbn': self._text('isbns', row),
+            'title': str(self.titles[row]),
+            'author': self._text('authors', row),
+            'year': int(self.arrays['years'][row]),
+            'publisher': self._text('publishers', row),
+            'img_url': self._text('img_urls', row)
+        }
+    
+    def _text(self, name, row):
+        value = self.arrays[name][row]
+        return value.decode('utf-8') if isinstance(value, bytes) else str(value)
+
+    def popular(self, limit):
+        """Return the rows of the most rated books"""
+        return self.arrays['popular'][:limit].tolist()
+
+    def search_titles(self, query, limit):
+        """Return rows whose title contains the query, case-insensitively"""
+        if self._lower_titles is None:
+            self._lower_titles = [title.lower() for title in self.titles.tolist()]
+        query = query.lower()
+        matches = []
+        for row, title in enumerate(self._lower_titles):
+            if query in title:
+                matches.append(row)
+                if len(matches) >= limit:
+                    break
+        return matches
@@ -0,0 +1,140 @@
+import http.client
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, urlencode
+from config import Config
+
+
+class ShardUnavailable(Exception):
+    """Raised when a shard server cannot be reached or answers with an error"""
+
+
+class ShardRouter:
+    """Fan lookups out to shard servers and merge their results
+
+    Shard i owns the neighbor lists and metadata of the books with
+    book_id % num_shards == i. A lookup asks the owners of the seed books
+    for (book_id, score) lists, then asks the owners of the listed books
+    for their metadata: one request per shard involved, sent in parallel.
+    """
+
+    def __init__(self, urls=Config.SHARD_URLS, timeout=Config.SHARD_TIMEOUT):
+        if not urls:
+            raise ValueError("No shard server URLs configured")
+        self.timeout = timeout
+        self._local = threading.local()
+        self.executor = ThreadPoolExecutor(max_workers=max(len(urls), 1), thread_name_prefix='shard')
+
+        infos = list(self.executor.map(lambda url: self._request(url, 'GET', '/info'), urls))
+        self.urls = [url for _, url in sorted(zip((info['shard'] for info in infos), urls))]
+        self.num_shards = len(urls)
+
+        if sorted(info['shard'] for info in infos) != list(range(self.num_shards)) or \
+                any(info['num_shards'] != self.num_shards for info in infos):
+            raise ValueError(f"Shard servers {urls} do not form one set of {self.num_shards} shards")
+        versions = {info['model_version'] for info in infos}
+        if len(versions) != 1:
+            raise ValueError(f"Shard servers hold different model versions: {sorted(versions)}")
+        self.model_version = versions.pop()
+
+    def shard_of(self, book_id):
+        return int(book_id) % self.num_shards
+
+    def _request(self, url, method, path, payload=None):
+        """Send one JSON request over this thread's keep-alive connection to a shard"""
+        connections = self._local.__dict__.setdefault('connections', {})
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+
+        # A kept-alive connection may have been closed by the server; retry once on a new one
+        for attempt in range(2):
+            connection = connections.get(url)
+            if connection is None:
+                parsed = urlparse(url)
+                connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=self.timeout)
+                connections[url] = connection
+            try:
+                connection.request(method, path, body=body, headers={'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                del connections[url]
+                if attempt:
+                    raise ShardUnavailable(f"Shard at {url} failed on {path}: {e}") from e
+                continue
+
+            if response.status != 200:
+                raise ShardUnavailable(f"Shard at {url} returned {response.status} on {path}")
+            return json.loads(data)
+
+    def _fan_out(self, requests):
+        """Run {shard: (method, path, payload)} requests in parallel and return {shard: response}"""
+        if len(requests) == 1:
+            shard, (method, path, payload) = next(iter(requests.items()))
+            return {shard: self._request(self.urls[shard], method, path, payload)}
+        futures = {shard: self.executor.submit(self._request, self.urls[shard], method, path, payload)
+                   for shard, (method, path, payload) in requests.items()}
+        return {shard: future.result() for shard, future in futures.items()}
+
+    def _by_shard(self, book_ids):
+        """Group book ids by owning shard, keeping their order"""
+        groups = {}
+        for book_id in book_ids:
+            groups.setdefault(self.shard_of(book_id), []).append(int(book_id))
+        return groups
+
+    def neighbors(self, book_ids, methods, top_n):
+        """Return {method: {book_id: [(book_id, score), ...]}} from the owners of the seed books"""
+        groups = self._by_shard(book_ids)
+        responses = self._fan_out({shard: ('POST', '/neighbors', {'book_ids': ids, 'methods': list(methods),
+                                                                  'top_n': top_n})
+                                   for shard, ids in groups.items()})
+        merged = {method: {} for method in methods}
+        for shard, ids in groups.items():
+            for method, lists in responses[shard]['neighbors'].items():
+                for book_id, pairs in zip(ids, lists):
+                    merged[method][book_id] = [(int(neighbor), score) for neighbor, score in pairs]
+        return merged
+
+    def books(self, book_ids):
+        """Return {book_id: metadata} for the served books among book_ids"""
+        groups = self._by_shard(set(book_ids))
+        if not groups:
+            return {}
+        responses = self._fan_out({shard: ('POST', '/books', {'book_ids': ids}) for shard, ids in groups.items()})
+        return {book['book_id']: book for response in responses.values() for book in response['books']}
+
+    def batch(self, book_ids, methods, top_n):
+        """Return {method: {book_id: [metadata with score, ...]}} for several seeds in two fan-outs"""
+        neighbors = self.neighbors(book_ids, methods, top_n)
+        books = self.books(neighbor for lists in neighbors.values() for pairs in lists.values()
+                           for neighbor, _ in pairs)
+        return {method: {book_id: [dict(books[neighbor], score=score) for neighbor, score in pairs
+                                   if neighbor in books]
+                         for book_id, pairs in lists.items()}
+                for method, lists in neighbors.items()}
+
+    def recommendations(self, book_id, methods, top_n):
+        """Return {method: [metadata with score, ...]} for one seed book"""
+        results = self.batch([book_id], methods, top_n)
+        return {method: lists[int(book_id)] for method, lists in results.items()}
+
+    def _gather(self, path, params):
+        """GET the same path from every shard and return the concatenated books"""
+        query = f'{path}?{urlencode(params)}'
+        responses = self._fan_out({shard: ('GET', query, None) for shard in range(self.num_shards)})
+        return [book for response in responses.values() for book in response['books']]
+
+    def search_titles(self, query, limit):
+        """Return the metadata of books whose title contains the query, in book id order"""
+        books = self._gather('/search', {'query': query, 'limit': limit})
+        return sorted(books, key=lambda book: book['book_id'])[:limit]
+
+    def titles(self):
+        """Return (book_ids, titles, num_ratings) of all served books, in book id order"""
+        responses = self._fan_out({shard: ('GET', '/titles', None) for shard in range(self.num_shards)})
+        rows = sorted(row for response in responses.values()
+                      for row in zip(response['book_ids'], response['titles'], response['num_ratings']))
+        book_ids, titles, num_ratings = (list(column) for column in zip(*rows)) if rows else ([], [], [])
+        return book_ids, titles, num_ratings
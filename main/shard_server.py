@@ -0,0 +1,197 @@
+"""Serve one shard of the serving artifact over HTTP, or launch several locally.
+
+Shard i of N holds the neighbor lists and metadata of the books with
+book_id % N == i (see ServingArtifact.shard). A ShardRouter in front of the
+shard servers fans lookups out to them and merges the results.
+
+Usage:
+    python main/shard_server.py --split 4
+    python main/shard_server.py --shard 0 --num-shards 4 --port 8101
+    python main/shard_server.py --launch 4
+
+--launch splits the current artifact, starts one local process per shard on
+consecutive ports and prints the BOOKSAGE_SHARDS value for the web app.
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from config import Config
+from serving_artifact import ServingArtifact
+from catalogue_store import CatalogueStore
+from http_cache import encode_json
+
+METHODS = ('collaborative', 'content', 'hybrid')
+
+
+def split_artifact(num_shards, models_dir=Config.MODELS_DIR):
+    """Write one shard file per shard from the full serving artifact"""
+    path = os.path.join(models_dir, ServingArtifact.FILENAME)
+    if not os.path.exists(path):
+        print(f"No serving artifact at {path}; train or export the models first")
+        return False
+
+    artifact = ServingArtifact.load(path)
+    for index in range(num_shards):
+        shard = artifact.shard(index, num_shards)
+        shard.save(os.path.join(models_dir, ServingArtifact.shard_filename(index, num_shards)))
+        print(f"Saved: {ServingArtifact.shard_filename(index, num_shards)} "
+              f"({shard.meta['num_items']} books, {shard.nbytes / 1e6:.1f} MB)")
+    return True
+
+
+class ShardHandler(BaseHTTPRequestHandler):
+    """JSON endpoints over the shard held by the server"""
+
+    # Keep-alive, so the router reuses its connections; headers and body go out
+    # in separate writes, so Nagle's algorithm would stall each response
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        shard = self.server.shard
+        limit = int(params.get('limit', ['10'])[0])
+
+        if url.path == '/info':
+            self._send({'shard': shard.meta['shard'], 'num_shards': shard.meta['num_shards'],
+                        'model_version': shard.model_version, 'num_items': shard.meta['num_items']})
+        elif url.path == '/titles':
+            self._send({'book_ids': shard.book_ids.tolist(), 'titles': shard.titles.tolist(),
+                        'num_ratings': shard.arrays['num_ratings'].tolist()})
+        elif url.path == '/search':
+            query = params.get('query', [''])[0]
+            self._send({'books': [self._book(row) for row in shard.search_titles(query, limit)]})
+        else:
+            self._send({'error': f"Unknown path: {url.path}"}, status=404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        except ValueError:
+            self._send({'error': "Invalid JSON"}, status=400)
+            return
+
+        book_ids = [int(book_id) for book_id in payload.get('book_ids', [])]
+        if url.path == '/neighbors':
+            methods = [method for method in payload.get('methods', []) if method in METHODS]
+            top_n = int(payload.get('top_n', Config.DEFAULT_TOP_N))
+            self._send({'neighbors': {method: [self._neighbors(book_id, method, top_n) for book_id in book_ids]
+                                      for method in methods}})
+        elif url.path == '/books':
+            rows = [self.server.shard.row_of(book_id) for book_id in book_ids]
+            self._send({'books': [self._book(row) for row in rows if row is not None]})
+        else:
+            self._send({'error': f"Unknown path: {url.path}"}, status=404)
+
+    def _neighbors(self, book_id, method, top_n):
+        """(book_id, score) pairs of one book this shard owns"""
+        shard = self.server.shard
+        row = shard.row_of(book_id)
+        if row is None:
+            return shard.fallback_neighbors(book_id, self.server.catalogue, top_n) if self.server.catalogue else []
+        if method == 'hybrid':
+            return shard.hybrid_neighbors(row, top_n)
+        return shard.neighbors(method, row, top_n)
+
+    def _book(self, row):
+        book_info = self.server.shard.book_info(row)
+        book_info['num_ratings'] = int(self.server.shard.arrays['num_ratings'][row])
+        return book_info
+
+    def _send(self, payload, status=200):
+        body = encode_json(payload)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(index, num_shards, port, host='127.0.0.1', models_dir=Config.MODELS_DIR):
+    """Serve one shard file until interrupted"""
+    path = os.path.join(models_dir, ServingArtifact.shard_filename(index, num_shards))
+    if not os.path.exists(path):
+        print(f"No shard file at {path}; run with --split {num_shards} first")
+        return False
+
+    server = ThreadingHTTPServer((host, port), ShardHandler)
+    server.daemon_threads = True
+    server.shard = ServingArtifact.load(path)
+    # The memory-mapped catalogue answers fallbacks for unserved books this shard owns
+    server.catalogue = CatalogueStore.open(os.path.join(models_dir, CatalogueStore.DIRNAME))
+    print(f"Shard {index}/{num_shards}: {server.shard.meta['num_items']} books on http://{host}:{port}", flush=True)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return True
+
+
+def launch(num_shards, base_port, host='127.0.0.1'):
+    """Split the artifact and run one local shard process per shard until interrupted"""
+    if not split_artifact(num_shards):
+        return False
+
+    processes = []
+    for index in range(num_shards):
+        command = [sys.executable, os.path.abspath(__file__), '--shard', str(index),
+                   '--num-shards', str(num_shards), '--port', str(base_port + index), '--host', host]
+        processes.append(subprocess.Popen(command))
+
+    urls = ','.join(f'http://{host}:{base_port + index}' for index in range(num_shards))
+    print(f"\nStart the web app with:\n  BOOKSAGE_SHARDS={urls} python app.py\n", flush=True)
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        for process in processes:
+            process.wait()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+        for process in processes:
+            process.wait()
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the serving artifact as book id shards")
+    parser.add_argument('--split', type=int, metavar='N', help="write N shard files and exit")
+    parser.add_argument('--launch', type=int, metavar='N', help="split into N shards and serve them locally")
+    parser.add_argument('--shard', type=int, help="index of the shard to serve")
+    parser.add_argument('--num-shards', type=int, help="total number of shards")
+    parser.add_argument('--port', type=int, help="port of the shard server")
+    parser.add_argument('--base-port', type=int, default=Config.SHARD_BASE_PORT, help="first port for --launch")
+    parser.add_argument('--host', default='127.0.0.1')
+    args = parser.parse_args()
+
+    if args.split:
+        ok = split_artifact(args.split)
+    elif args.launch:
+        ok = launch(args.launch, args.base_port, args.host)
+    elif args.shard is not None and args.num_shards:
+        port = args.port if args.port else args.base_port + args.shard
+        ok = serve(args.shard, args.num_shards, port, args.host)
+    else:
+        parser.print_usage()
+        ok = False
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
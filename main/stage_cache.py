@@ -0,0 +1,99 @@
+import hashlib
+import os
+import pickle
+import time
+from pathlib import Path
+from config import Config
+
+
+def hash_file(path, chunk_size=1 << 20):
+    """SHA-1 of a file's contents"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class StageCache:
+    """On-disk cache of training pipeline stage outputs, keyed by content
+
+    A stage key hashes the stage name, its inputs (upstream stage keys, or
+    the contents of data and source files) and the Config values the stage
+    reads, so a stage is reused exactly when none of those changed.
+    """
+
+    def __init__(self, directory=Config.STAGE_CACHE_DIR, enabled=Config.STAGE_CACHE_ENABLED,
+                 keep=Config.STAGE_CACHE_KEEP):
+        self.directory = Path(directory)
+        self.enabled = enabled
+        self.keep = keep
+        self.summary = []
+        self._file_hashes = {}
+
+    def key(self, stage, inputs=(), config=()):
+        """Return the content key of a stage"""
+        digest = hashlib.sha1(stage.encode('utf-8'))
+        for item in inputs:
+            if isinstance(item, Path):
+                if item not in self._file_hashes:
+                    self._file_hashes[item] = hash_file(item) if item.exists() else 'missing'
+                item = f'{item.name}:{self._file_hashes[item]}'
+            digest.update(b'\0' + str(item).encode('utf-8'))
+        for name in config:
+            digest.update(f'\0{name}={getattr(Config, name)!r}'.encode('utf-8'))
+        return digest.hexdigest()[:20]
+
+    def _path(self, stage, key):
+        return self.directory / f'{stage}-{key}.pkl'
+
+    def run(self, stage, compute, key):
+        """Return (key, output) of a stage with the given key, computing and storing it only on a cache miss
+
+        compute() returning None marks a failed stage, which is not cached.
+        """
+        path = self._path(stage, key)
+        start = time.perf_counter()
+
+        if self.enabled and path.exists():
+            try:
+                with open(path, 'rb') as f:
+                    output = pickle.load(f)
+                print(f"Reusing cached {stage} stage ({key})")
+                self.record(stage, key, True, time.perf_counter() - start)
+                return key, output
+            except Exception as e:
+                print(f"Ignoring unreadable cache entry {path.name}: {e}")
+
+        output = compute()
+        if output is not None and self.enabled:
+            self._store(stage, key, output)
+        self.record(stage, key, False, time.perf_counter() - start)
+        return key, output
+
+    def _store(self, stage, key, output):
+        """Write one entry atomically and drop the oldest entries of the stage"""
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self._path(stage, key)
+            temp_path = path.with_suffix('.tmp')
+            with open(temp_path, 'wb') as f:
+                pickle.dump(output, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+
+            entries = sorted(self.directory.glob(f'{stage}-*.pkl'), key=lambda p: p.stat().st_mtime, reverse=True)
+            for old in entries[self.keep:]:
+                old.unlink()
+
+        except Exception as e:
+            print(f"Error caching {stage} stage: {e}")
+
+    def record(self, stage, key, hit, seconds):
+        self.summary.append((stage, key, hit, seconds))
+
+    def print_summary(self):
+        """Display which stages were reused"""
+        hits = sum(1 for _, _, hit, _ in self.summary if hit)
+        print(f"\nStage cache: {hits}/{len(self.summary)} stages reused")
+        for stage, key, hit, seconds in self.summary:
+            print(f"  {stage:<15}{'hit' if hit else 'miss':<6}{key:<22}{seconds:>8.2f}s")
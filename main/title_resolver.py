@@ -0,0 +1,130 @@
+import re
+import unicodedata
+from array import array
+from collections import Counter
+from config import Config
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+_SUBTITLE = re.compile(r'\s*[:(\[;].*$')
+
+
+def normalize_title(title):
+    """Normalize a title to a lookup key: ASCII-folded, lowercase, punctuation collapsed"""
+    if not isinstance(title, str):
+        return ''
+    folded = unicodedata.normalize('NFKD', title).encode('ascii', 'ignore').decode('ascii')
+    return _NON_ALNUM.sub(' ', folded.lower()).strip()
+
+
+def main_title(title):
+    """Return the title without its subtitle or series/edition suffix"""
+    if not isinstance(title, str):
+        return ''
+    return _SUBTITLE.sub('', title)
+
+
+def trigrams(key):
+    """Return the set of character trigrams of a normalized key"""
+    padded = f'  {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TitleResolver:
+    """Resolve free-text queries to known titles
+
+    Lookup goes through an exact map of normalized full titles, then a map
+    of main titles without subtitle, then a trigram inverted index: candidates
+    are gathered from the query's rarest trigrams and the best supported
+    ones are scored by Dice similarity, which handles typos and partial
+    titles without scanning every title.
+    """
+
+    def __init__(self, titles, popularity=None, min_similarity=Config.RESOLVER_MIN_SIMILARITY):
+        self.titles = list(titles)
+        self.min_similarity = min_similarity
+        self.popularity = list(popularity) if popularity is not None else [0] * len(self.titles)
+
+        # When several titles share a key, the most popular one wins
+        order = sorted(range(len(self.titles)), key=lambda i: -self.popularity[i])
+
+        self.exact = {}
+        self.short = {}
+        self.keys = []
+        self.key_rows = []
+        self.key_sizes = array('i')
+        self.index = {}
+
+        self._key_ids = {}
+        for row in order:
+            self._index_row(row)
+
+    def _index_row(self, row):
+        title = self.titles[row]
+        full_key = normalize_title(title)
+        short_key = normalize_title(main_title(title))
+        # A full title always beats another book's subtitle-stripped title
+        for key, keys in ((full_key, self.exact), (short_key, self.short)):
+            if not key:
+                continue
+            keys.setdefault(key, row)
+            if key in self._key_ids:
+                if keys is self.exact:
+                    # Fuzzy matches on this key also go to the full-title owner
+                    self.key_rows[self._key_ids[key]] = self.exact[key]
+                continue
+            self._key_ids[key] = len(self.keys)
+            grams = trigrams(key)
+            for gram in grams:
+                self.index.setdefault(gram, array('i')).append(self._key_ids[key])
+            self.keys.append(key)
+            self.key_rows.append(row)
+            self.key_sizes.append(len(grams))
+
+    def __len__(self):
+        return len(self.titles)
+
+    def add(self, title, popularity=0):
+        """Add one title and return its row; existing keys keep their current title"""
+        row = len(self.titles)
+        self.titles.append(title)
+        self.popularity.append(popularity)
+        self._index_row(row)
+        return row
+
+    def resolve(self, query):
+        """Return (row, title, similarity) for the best match, or None"""
+        if not isinstance(query, str):
+            return None
+
+        key = normalize_title(query)
+        if not key:
+            return None
+        for candidate in (key, normalize_title(main_title(query))):
+            for keys in (self.exact, self.short):
+                row = keys.get(candidate)
+                if row is not None:
+                    return row, self.titles[row], 1.0
+
+        # Fuzzy match: gather candidates from the rarest trigrams the index
+        # knows about, then score only the best-supported candidates exactly
+        grams = trigrams(key)
+        known = sorted((gram for gram in grams if gram in self.index), key=lambda gram: len(self.index[gram]))
+        if not known:
+            return None
+        support = Counter()
+        for gram in known[:Config.RESOLVER_PROBE_GRAMS]:
+            support.update(self.index[gram])
+
+        num_grams = len(grams)
+        best_id, best_score = -1, 0.0
+        for key_id, _ in support.most_common(Config.RESOLVER_MAX_CANDIDATES):
+            shared = len(grams & trigrams(self.keys[key_id]))
+            score = 2.0 * shared / (num_grams + self.key_sizes[key_id])
+            if score > best_score or (score == best_score and
+                                      self.popularity[self.key_rows[key_id]] > self.popularity[self.key_rows[best_id]]):
+                best_id, best_score = key_id, score
+
+        if best_score < self.min_similarity:
+            return None
+        row = self.key_rows[best_id]
+        return row, self.titles[row], best_score
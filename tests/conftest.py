@@ -0,0 +1,72 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Tests import the app modules the way main/ does, as top-level modules, and app/asgi from the root
+sys.path.insert(0, BASE_DIR)
+sys.path.insert(0, os.path.join(BASE_DIR, 'main'))
+
+NUM_BOOKS = 60
+
+
+@pytest.fixture
+def served_models(tmp_path):
+    """(artifact, cf_model, cb_model) for 60 books "Book 0".."Book 59", catalogue in tmp_path/catalogue"""
+    np = pytest.importorskip('numpy')
+    pd = pytest.importorskip('pandas')
+    from catalogue_store import CatalogueStore
+    from serving_artifact import ServingArtifact
+
+    class FakeContentModel:
+        """Content similarities from fixed random vectors; every third book has no content"""
+
+        def __init__(self, book_ids, rng):
+            self.book_ids = [book_id for book_id in book_ids if book_id % 3]
+            vectors = rng.random((len(self.book_ids), 8))
+            self.vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+        def rows_of(self, book_ids):
+            rows = {book_id: row for row, book_id in enumerate(self.book_ids)}
+            return np.array([rows.get(int(book_id), -1) for book_id in book_ids], dtype=np.int64)
+
+        def similarity(self, rows, cols):
+            return self.vectors[rows] @ self.vectors[cols].T
+
+    rng = np.random.default_rng(0)
+    book_ids = np.arange(NUM_BOOKS)
+    books = pd.DataFrame({
+        'book_id': book_ids, 'ISBN': [f'isbn{i}' for i in book_ids], 'title': [f'Book {i}' for i in book_ids],
+        'author': [f'Author {i % 7}' for i in book_ids], 'publisher': [f'Publisher {i % 4}' for i in book_ids],
+        'year': ['2000'] * NUM_BOOKS, 'img_url': [''] * NUM_BOOKS
+    })
+    CatalogueStore.build(books, tmp_path / CatalogueStore.DIRNAME)
+    catalogue = CatalogueStore.open(tmp_path / CatalogueStore.DIRNAME)
+
+    pivot = pd.DataFrame(rng.random((NUM_BOOKS, 20)) * (rng.random((NUM_BOOKS, 20)) < 0.5), index=book_ids)
+    cf_model = SimpleNamespace(book_pivot=pivot)
+    cb_model = FakeContentModel(book_ids, rng)
+    final_rating = pd.DataFrame({'book_id': rng.integers(0, NUM_BOOKS, 500), 'rating': 5})
+    artifact = ServingArtifact.build(cf_model, cb_model, {'catalogue': catalogue, 'final_rating': final_rating},
+                                     top_k=20)
+    yield artifact, cf_model, cb_model
+    catalogue.close()
+
+
+@pytest.fixture
+def served_app(served_models, tmp_path, monkeypatch):
+    """The app module, freshly imported to serve the served_models artifact from tmp_path"""
+    pytest.importorskip('flask')
+    pytest.importorskip('asgiref')
+    from config import Config
+    from serving_artifact import ServingArtifact
+
+    artifact, _, _ = served_models
+    artifact.save(tmp_path / ServingArtifact.FILENAME)
+    monkeypatch.setattr(Config, 'MODELS_DIR', tmp_path)
+    for name in ('app', 'asgi'):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+    import app
+    return app
@@ -0,0 +1,65 @@
+import asyncio
+import json
+import sys
+import time
+
+import pytest
+
+DELAY = 0.3
+
+
+@pytest.fixture
+def asgi(served_app, monkeypatch):
+    """The shipped ASGI entry point, with a slow hybrid recommender"""
+    import asgi
+
+    def slow_recommendations(book_id, top_n):
+        time.sleep(DELAY)
+        return []
+    monkeypatch.setitem(served_app.RECOMMENDERS, 'hybrid', slow_recommendations)
+    return asgi
+
+
+async def get(asgi_app, path, query):
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': query.encode('ascii'),
+             'headers': [], 'http_version': '1.1', 'root_path': '', 'scheme': 'http', 'server': ('test', 80)}
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await asgi_app(scope, receive, send)
+    status = messages[0]['status']
+    body = b''.join(message.get('body', b'') for message in messages[1:])
+    return status, json.loads(body)
+
+
+def run_concurrently(asgi, titles):
+    async def main():
+        return await asyncio.gather(*(get(asgi.asgi_app, '/api/recommendations',
+                                          f'book_title={title}&method=hybrid') for title in titles))
+    start = time.perf_counter()
+    responses = asyncio.run(main())
+    return responses, time.perf_counter() - start
+
+
+def test_identical_concurrent_requests_are_coalesced(asgi):
+    coalescer = sys.modules['app'].coalescer
+    before = dict(coalescer.stats)
+    responses, elapsed = run_concurrently(asgi, ['Book+5'] * 4)
+
+    assert [status for status, _ in responses] == [200] * 4
+    assert all(body['book_id'] == 5 for _, body in responses)
+    assert coalescer.stats['coalesced'] - before['coalesced'] > 0
+    assert coalescer.stats['computed'] - before['computed'] == 1
+    assert elapsed < 2 * DELAY
+
+
+def test_distinct_concurrent_requests_run_in_parallel(asgi):
+    responses, elapsed = run_concurrently(asgi, ['Book+1', 'Book+2', 'Book+4', 'Book+7'])
+
+    assert [body['book_id'] for _, body in responses] == [1, 2, 4, 7]
+    assert elapsed < 2 * DELAY
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+
+from catalogue_store import CatalogueStore
+
+# Many titles contain "Dune", so the exact one is far past any substring match limit
+TITLES = [f'Dune Messiah: Part {i}' for i in range(80)] + ['Dune', 'Children of Dune: A Novel', 'Café Society']
+
+
+def build_catalogue(directory, titles=TITLES):
+    count = len(titles)
+    books = pd.DataFrame({
+        'book_id': range(count), 'ISBN': [str(i) for i in range(count)], 'title': titles,
+        'author': ['Frank Herbert'] * count, 'publisher': ['Ace'] * count,
+        'year': ['1965'] * count, 'img_url': [''] * count
+    })
+    CatalogueStore.build(books, directory)
+    return CatalogueStore.open(directory)
+
+
+def test_exact_title_is_found_among_many_substring_matches(tmp_path):
+    catalogue = build_catalogue(tmp_path)
+    assert catalogue.find_title('dune') == (80, 'Dune')
+    assert catalogue.find_title('Dune Messiah: Part 79') == (79, 'Dune Messiah: Part 79')
+    assert catalogue.find_title('cafe society!') == (82, 'Café Society')
+    catalogue.close()
+
+
+def test_main_title_matches_without_subtitle(tmp_path):
+    catalogue = build_catalogue(tmp_path)
+    assert catalogue.find_title('Children of Dune') == (81, 'Children of Dune: A Novel')
+    # The lowest book id wins among books sharing a main title
+    assert catalogue.find_title('Dune Messiah') == (0, 'Dune Messiah: Part 0')
+    assert catalogue.find_title('Dune Messiah: Part 200') == (0, 'Dune Messiah: Part 0')
+    assert catalogue.find_title('Dune Chronicles') is None
+    assert catalogue.find_title('  ') is None
+    catalogue.close()
+
+
+def test_catalogue_without_key_tables(tmp_path):
+    build_catalogue(tmp_path).close()
+    for name in CatalogueStore.KEY_TABLES:
+        os.remove(tmp_path / f'{name}.npy')
+
+    catalogue = CatalogueStore.open(tmp_path)
+    assert catalogue.find_title('Dune') == (80, 'Dune')
+    assert catalogue.find_title('Children of Dune') == (81, 'Children of Dune: A Novel')
+    catalogue.close()
@@ -0,0 +1,50 @@
+from types import SimpleNamespace
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+
+from catalogue_store import CatalogueStore
+from cold_start import ColdStartFallbacks
+from serving_artifact import ServingArtifact
+
+# Books 0-9 are served; book 10 is only in the catalogue
+AUTHORS = ['Le Guin', 'Le Guin', 'Herbert', 'Le Guin', 'Banks', 'Herbert', 'Banks', 'Le Guin', 'Herbert', 'Banks',
+           'Le Guin']
+PUBLISHERS = ['Ace', 'Tor', 'Ace', 'Orbit', 'Orbit', 'Ace', 'Tor', 'Tor', 'Ace', 'Orbit', 'Ace']
+POPULARITY = [5, 9, 3, 7, 8, 1, 2, 6, 4, 10]
+
+
+@pytest.fixture
+def catalogue(tmp_path):
+    count = len(AUTHORS)
+    books = pd.DataFrame({
+        'book_id': range(count), 'ISBN': [str(i) for i in range(count)], 'title': [f'Book {i}' for i in range(count)],
+        'author': AUTHORS, 'publisher': PUBLISHERS, 'year': ['2000'] * count, 'img_url': [''] * count
+    })
+    CatalogueStore.build(books, tmp_path)
+    catalogue = CatalogueStore.open(tmp_path)
+    yield catalogue
+    catalogue.close()
+
+
+def test_lookup_walks_author_publisher_then_popular(catalogue):
+    fallbacks = ColdStartFallbacks.build(np.arange(10), POPULARITY, catalogue, limit=3)
+    assert fallbacks.lookup(10, catalogue, 9) == [
+        (1, 'author'), (3, 'author'), (7, 'author'),
+        (0, 'publisher'), (8, 'publisher'), (2, 'publisher'),
+        (9, 'popular'), (4, 'popular')
+    ]
+
+
+def test_fallback_scores_do_not_depend_on_top_n(catalogue):
+    fallbacks = ColdStartFallbacks.build(np.arange(10), POPULARITY, catalogue, limit=3)
+    artifact = SimpleNamespace(cold_start=fallbacks)
+    short = ServingArtifact.fallback_neighbors(artifact, 10, catalogue, 2)
+    long = ServingArtifact.fallback_neighbors(artifact, 10, catalogue, 9)
+
+    assert long[:2] == short
+    scores = [score for _, score in long]
+    assert scores == sorted(scores, reverse=True) and len(set(scores)) == len(scores)
+    assert scores[0] == 1.0 and scores[-1] > 0
@@ -0,0 +1,48 @@
+import math
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('pandas')
+scipy_sparse = pytest.importorskip('scipy.sparse')
+pytest.importorskip('sklearn')
+
+from evaluator import ModelEvaluator
+
+# Five items; user 0 rated item 0, user 1 rated item 3
+SIMILARITY = np.array([
+    [0.0, 0.9, 0.8, 0.1, 0.2],
+    [0.9, 0.0, 0.3, 0.1, 0.1],
+    [0.8, 0.3, 0.0, 0.2, 0.1],
+    [0.5, 0.1, 0.2, 0.0, 0.4],
+    [0.2, 0.1, 0.1, 0.4, 0.0],
+])
+PROFILES = scipy_sparse.csr_matrix(np.array([[1, 0, 0, 0, 0], [0, 0, 0, 1, 0]], dtype=np.float32))
+TRUTH = scipy_sparse.csr_matrix(np.array([[0, 0, 1, 0, 1], [1, 0, 0, 0, 0]], dtype=np.float32))
+
+
+def make_evaluator(batch_size):
+    return ModelEvaluator({'final_rating': None, 'books_content': None}, k=2, workers=1, batch_size=batch_size)
+
+
+@pytest.mark.parametrize('batch_size', [1, 2])
+def test_metrics_match_a_hand_computed_example(batch_size):
+    metrics = make_evaluator(batch_size)._score(SIMILARITY, PROFILES, TRUTH)
+
+    # User 0 gets [1, 2] and holds out {2, 4}: one hit at rank 2 of two relevant items.
+    # User 1 gets [0, 4] and holds out {0}: one hit at rank 1.
+    ndcg_user0 = (1 / math.log2(3)) / (1 + 1 / math.log2(3))
+    assert metrics['recall@2'] == pytest.approx((1 / 2 + 1) / 2)
+    assert metrics['precision@2'] == pytest.approx((1 / 2 + 1 / 2) / 2)
+    assert metrics['ndcg@2'] == pytest.approx((ndcg_user0 + 1) / 2)
+    assert metrics['coverage'] == pytest.approx(4 / 5)
+
+
+def test_rated_items_are_never_recommended():
+    profiles = scipy_sparse.csr_matrix(np.array([[1, 1, 0, 0, 0]], dtype=np.float32))
+    truth = scipy_sparse.csr_matrix(np.array([[0, 0, 0, 1, 0]], dtype=np.float32))
+    metrics = make_evaluator(1)._score(SIMILARITY, profiles, truth)
+
+    # Items 0 and 1 are masked, so the top 2 of [-, -, 1.1, 0.2, 0.3] are items 2 and 4
+    assert metrics['recall@2'] == 0.0
+    assert metrics['coverage'] == pytest.approx(2 / 5)
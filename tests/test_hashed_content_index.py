@@ -0,0 +1,134 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('scipy')
+pytest.importorskip('sklearn')
+
+from hashed_content_index import HashedContentIndex
+
+TEXTS = {
+    10: "dragon quest magic sword kingdom",
+    11: "dragon magic wizard tower spell",
+    12: "murder detective london mystery",
+    13: "detective murder case police inspector",
+    14: "space ship galaxy alien empire",
+    15: "galaxy empire star fleet war",
+}
+NEW_BOOK = (20, "dragon wizard magic kingdom spell")
+
+
+def make_index(texts=TEXTS):
+    index = HashedContentIndex(n_features=2 ** 12, top_k=3)
+    index.build(list(texts), list(texts.values()))
+    return index
+
+
+def neighbor_ids(index, book_id):
+    return [neighbor for neighbor, _ in index.neighbors_of(book_id)]
+
+
+def test_added_book_enters_its_neighbors_lists():
+    index = make_index()
+    index.add_or_update(*NEW_BOOK)
+
+    assert set(neighbor_ids(index, 20)[:2]) == {10, 11}
+    assert 20 in neighbor_ids(index, 10)
+    assert 20 in neighbor_ids(index, 11)
+    assert 20 not in neighbor_ids(index, 12)
+
+
+def test_update_replaces_a_books_text():
+    index = make_index()
+    index.add_or_update(12, "space galaxy alien fleet")
+    assert 12 in neighbor_ids(index, 14)
+    assert 13 not in neighbor_ids(index, 12)[:1]
+
+
+def query_ids(index, text):
+    return [book_id for book_id, _ in index.query(text, 3)]
+
+
+def test_compaction_keeps_query_results():
+    index = make_index()
+    index.add_or_update(*NEW_BOOK)
+    before = query_ids(index, "dragon magic spell")
+    index.compact()
+
+    # Refreshed IDF weights may reorder close scores but not change the results
+    assert set(query_ids(index, "dragon magic spell")) == set(before)
+    assert not index._staged
+
+
+def test_compaction_without_idf_change_is_exact():
+    index = make_index()
+    index.add_or_update(13, TEXTS[13])
+    before = {book_id: index.neighbors_of(book_id) for book_id in TEXTS}
+    queries = [query_ids(index, text) for text in ("murder police", "galaxy war")]
+    index.compact()
+
+    for book_id in TEXTS:
+        assert [n for n, _ in index.neighbors_of(book_id)] == [n for n, _ in before[book_id]]
+        assert np.allclose([s for _, s in index.neighbors_of(book_id)], [s for _, s in before[book_id]])
+    assert [query_ids(index, text) for text in ("murder police", "galaxy war")] == queries
+
+
+def test_compaction_matches_a_fresh_build():
+    index = make_index()
+    index.add_or_update(*NEW_BOOK)
+    index.compact()
+    fresh = make_index({**TEXTS, NEW_BOOK[0]: NEW_BOOK[1]})
+
+    for book_id in list(TEXTS) + [NEW_BOOK[0]]:
+        assert neighbor_ids(index, book_id) == neighbor_ids(fresh, book_id)
+    assert index.neighbors_of(99) is None
+
+
+def test_content_model_add_book_and_compact():
+    pd = pytest.importorskip('pandas')
+    from content_model import ContentBasedModel
+
+    model = ContentBasedModel()
+    model.mode = 'hashed'
+    model.train(pd.DataFrame({'book_id': list(TEXTS), 'content_features': list(TEXTS.values())}))
+    assert model.add_book(*NEW_BOOK)
+    assert model.index.neighbors_of(NEW_BOOK[0]) is not None
+
+    before = set(book_id for book_id, _ in model.query("dragon magic spell", 3))
+    model.compact()
+    assert set(book_id for book_id, _ in model.query("dragon magic spell", 3)) == before
+    assert 20 in [book_id for book_id, _ in model.index.neighbors_of(10)]
+
+
+def test_content_model_add_book_needs_hashed_mode():
+    pd = pytest.importorskip('pandas')
+    from content_model import ContentBasedModel
+
+    model = ContentBasedModel()
+    model.mode = 'tfidf'
+    model.train(pd.DataFrame({'book_id': list(TEXTS), 'content_features': list(TEXTS.values())}))
+    assert not model.add_book(*NEW_BOOK)
+
+
+def test_hashed_model_is_saved_without_tfidf_files(tmp_path, monkeypatch):
+    pd = pytest.importorskip('pandas')
+    from types import SimpleNamespace
+    from config import Config
+    from content_model import ContentBasedModel
+    from model_manager import ModelManager
+
+    monkeypatch.setattr(Config, 'MODELS_DIR', tmp_path)
+    manager = ModelManager()
+    monkeypatch.setattr(manager, 'export_serving_artifact', lambda *args: True)
+    # Left over from an earlier TF-IDF model
+    for filename in ModelManager.TFIDF_FILES:
+        (tmp_path / filename).write_bytes(b'stale')
+
+    model = ContentBasedModel()
+    model.mode = 'hashed'
+    books_content = pd.DataFrame({'book_id': list(TEXTS), 'content_features': list(TEXTS.values())})
+    model.train(books_content)
+    processed_data = {'books_content': books_content, 'final_rating': pd.DataFrame()}
+    assert manager.save_models(SimpleNamespace(book_pivot=pd.DataFrame()), model, processed_data)
+
+    assert (tmp_path / 'cb_model.pkl').exists()
+    assert not any((tmp_path / filename).exists() for filename in ModelManager.TFIDF_FILES)
@@ -0,0 +1,42 @@
+import gzip
+import json
+
+from http_cache import accepts_gzip, compress, encode_json, make_etag
+
+
+def test_etag_depends_on_model_version_and_inputs():
+    etag = make_etag('v1', '/recommend', 'Dune', 'hybrid', 9)
+    assert etag == make_etag('v1', '/recommend', 'Dune', 'hybrid', 9)
+    assert etag != make_etag('v2', '/recommend', 'Dune', 'hybrid', 9)
+    assert etag != make_etag('v1', '/recommend', 'Dune', 'content', 9)
+
+
+def test_accepts_gzip():
+    assert accepts_gzip('gzip, deflate, br')
+    assert accepts_gzip('*')
+    assert not accepts_gzip('gzip;q=0')
+    assert not accepts_gzip('deflate')
+    assert not accepts_gzip(None)
+
+
+def test_compress_round_trips_large_bodies_only():
+    payload = [{'title': f'Book {i}', 'score': i / 10} for i in range(100)]
+    body = encode_json(payload)
+    compressed, encoding = compress(body, 'gzip')
+    assert encoding == 'gzip'
+    assert json.loads(gzip.decompress(compressed)) == payload
+
+    assert compress(b'[]', 'gzip') == (b'[]', None)
+    assert compress(body, 'identity') == (body, None)
+
+
+def test_only_get_responses_are_publicly_cacheable(served_app):
+    client = served_app.app.test_client()
+    response = client.get('/recommend?book_title=Book+5&method=content')
+    assert response.headers['Cache-Control'].startswith('public')
+    assert response.headers.get('ETag')
+
+    response = client.post('/recommend', data={'book_title': 'Book 5', 'method': 'content'})
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'no-store'
+    assert 'ETag' not in response.headers
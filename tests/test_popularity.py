@@ -0,0 +1,153 @@
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from popularity import DecayedCounter, PopularityTracker, RatingEventLog
+
+NOW = 1_700_000_000.0
+DAY = 24 * 3600
+
+
+def seed():
+    # Book 0 is the most rated in training
+    return np.array([0, 1, 2]), np.array([50, 20, 10])
+
+
+@pytest.fixture
+def log(tmp_path):
+    return RatingEventLog(tmp_path / 'events.log')
+
+
+def open_tracker(log, tmp_path, num_books=None):
+    return PopularityTracker.open(seed, 'v1', log, tmp_path / 'snapshot.npz', num_books=num_books)
+
+
+def brute_force_top(book_ids, timestamps, half_life, k, now):
+    counts = {}
+    for book_id, timestamp in zip(book_ids, timestamps):
+        counts[book_id] = counts.get(book_id, 0.0) + 2 ** ((timestamp - now) / half_life)
+    return sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:k]
+
+
+def test_top_k_matches_brute_force():
+    rng = np.random.default_rng(0)
+    counter = DecayedCounter(DAY, capacity=10, landmark=NOW)
+    book_ids, timestamps = [], []
+    for batch in range(50):
+        # Zipf-like ids, so the top-k keeps changing between batches
+        ids = np.minimum(rng.zipf(1.3, 200), 500)
+        times = NOW + batch * 3600 + rng.random(200) * 3600
+        counter.add(ids, times)
+        book_ids.extend(ids.tolist())
+        timestamps.extend(times.tolist())
+
+    now = NOW + 50 * 3600
+    expected = brute_force_top(book_ids, timestamps, DAY, 10, now)
+    result = counter.top_k(10, now)
+    assert [book_id for book_id, _ in result] == [book_id for book_id, _ in expected]
+    assert np.allclose([count for _, count in result], [count for _, count in expected])
+
+
+def test_landmark_rebasing_keeps_counts():
+    counter = DecayedCounter(3600, landmark=NOW)
+    counter.add([1, 2, 2], [NOW, NOW, NOW])
+    later = NOW + (DecayedCounter.MAX_EXPONENT + 10) * 3600
+    counter.add([3], [later])
+
+    assert counter.landmark == later
+    assert np.isfinite(counter.values).all()
+    # Books 1 and 2 have decayed to nothing; book 3 counts one full event
+    assert counter.top_k(1, later) == [(3, pytest.approx(1.0))]
+    counter.add([2], [later])
+    assert counter.top_k(3, later)[0] == (2, pytest.approx(1.0 + 2 * 2.0 ** -(DecayedCounter.MAX_EXPONENT + 10)))
+
+
+def test_read_skips_partial_and_malformed_lines(log):
+    log.append(4, 'u1', 8, timestamp=NOW)
+    with open(log.path, 'a') as f:
+        f.write("not a line\n")
+        f.write(f"{NOW}\tu2\t-5\t7\n")
+        f.write(f"{NOW}\tu3\t6")
+
+    book_ids, timestamps, offset = log.read(0)
+    assert book_ids.tolist() == [4]
+    assert timestamps.tolist() == [pytest.approx(NOW)]
+
+    # The partial last line is read once it is complete
+    with open(log.path, 'a') as f:
+        f.write("\t9\n")
+    book_ids, _, end = log.read(offset)
+    assert book_ids.tolist() == [6]
+    assert end == os.path.getsize(log.path)
+
+
+def test_trending_follows_new_events_and_version_changes(log, tmp_path):
+    tracker = open_tracker(log, tmp_path)
+    assert [book_id for book_id, _ in tracker.popular(3)] == [0, 1, 2]
+    assert tracker.trending(3) == []
+    version = tracker.version
+
+    for _ in range(3):
+        log.append(2)
+    assert tracker.refresh(force=True) == 3
+    assert tracker.version != version
+    assert [book_id for book_id, _ in tracker.trending(3)] == [2]
+
+
+def test_book_ids_outside_the_catalogue_are_dropped(log, tmp_path):
+    log.append(2)
+    log.append(10 ** 12)
+    tracker = open_tracker(log, tmp_path, num_books=5)
+    assert tracker.events == 1
+    assert len(tracker.counters['trending'].values) <= 5
+
+    # Without a catalogue size the seed bounds the ids
+    tracker = open_tracker(log, tmp_path / 'other')
+    assert tracker.num_books == 3
+
+
+def test_rotated_log_is_read_from_the_start(log, tmp_path):
+    log.append(1)
+    log.append(1)
+    tracker = open_tracker(log, tmp_path)
+    assert tracker.events == 2
+
+    rotated = log.path.with_name('events.log.1')
+    os.replace(log.path, rotated)
+    log.append(2)
+    assert tracker.refresh(force=True) == 1
+    assert tracker.offset == os.path.getsize(log.path)
+    assert [book_id for book_id, _ in tracker.trending(2)] == [1, 2]
+
+
+def test_snapshot_resumes_without_reseeding(log, tmp_path):
+    log.append(1, timestamp=NOW)
+    tracker = open_tracker(log, tmp_path)
+    # The first snapshot waits for the snapshot interval
+    assert not (tmp_path / 'snapshot.npz').exists()
+    tracker.save_snapshot()
+    assert not list(tmp_path.glob('*.tmp.npz'))
+
+    log.append(2, timestamp=NOW + 3600)
+    def no_seed():
+        raise AssertionError("seed() should not be called when resuming")
+    resumed = PopularityTracker.open(no_seed, 'v1', log, tmp_path / 'snapshot.npz')
+    assert resumed.events == 2
+    # The later event has decayed less
+    assert [book_id for book_id, _ in resumed.trending(5)] == [2, 1]
+    assert resumed.popular(1)[0][0] == 0
+
+    # A snapshot from other models is ignored
+    reseeded = PopularityTracker.open(seed, 'v2', log, tmp_path / 'snapshot.npz')
+    assert reseeded.events == 2
+    assert reseeded.offset == resumed.offset
+
+
+def test_snapshot_temp_file_is_per_process(log, tmp_path, monkeypatch):
+    tracker = open_tracker(log, tmp_path)
+    written = []
+    monkeypatch.setattr(np, 'savez', lambda path, **arrays: written.append(path) or open(path, 'wb').close())
+    tracker.save_snapshot()
+    assert written[0].name == f'snapshot.{os.getpid()}.tmp.npz'
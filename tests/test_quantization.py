@@ -0,0 +1,40 @@
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('pandas')
+
+from config import Config
+from model_manager import ModelManager
+
+
+def test_full_precision_artifact_agrees_with_exact_scores(served_models):
+    artifact, cf_model, cb_model = served_models
+    agreement, score_error = artifact.exact_agreement(cf_model, cb_model)
+
+    assert min(agreement.values()) == pytest.approx(1.0)
+    assert score_error < 1e-5
+
+
+def test_fine_quantization_is_kept(served_models, tmp_path, monkeypatch):
+    artifact, cf_model, cb_model = served_models
+    monkeypatch.setattr(Config, 'MODELS_DIR', tmp_path)
+
+    quantized = ModelManager()._quantize_artifact(artifact, cf_model, cb_model, score_bits=16)
+    assert quantized is not artifact
+    assert quantized.meta['score_bits'] == 16
+
+
+def test_coarse_quantization_trips_the_guardrail(served_models, tmp_path, monkeypatch):
+    artifact, cf_model, cb_model = served_models
+    monkeypatch.setattr(Config, 'MODELS_DIR', tmp_path)
+
+    agreement, score_error = artifact.quantize(2).exact_agreement(cf_model, cb_model)
+    assert score_error > Config.QUANTIZE_MAX_SCORE_ERROR
+    assert agreement['hybrid'] < 1.0
+    assert ModelManager()._quantize_artifact(artifact, cf_model, cb_model, score_bits=2) is artifact
+
+
+def test_score_bits_out_of_range(served_models):
+    artifact, _, _ = served_models
+    with pytest.raises(ValueError):
+        artifact.quantize(24)
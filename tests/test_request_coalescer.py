@@ -0,0 +1,61 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from request_coalescer import RequestCoalescer, ServerOverloaded
+
+
+def test_identical_requests_share_one_computation():
+    coalescer = RequestCoalescer(workers=2, max_pending=4)
+    release = threading.Event()
+    calls = []
+
+    def compute(value):
+        calls.append(value)
+        release.wait(5)
+        return [value]
+
+    first = coalescer.submit(('a', 'hybrid', 9), compute, 1)
+    second = coalescer.submit(('a', 'hybrid', 9), compute, 1)
+    release.set()
+
+    assert first is second
+    assert first.result(5) == [1]
+    assert calls == [1]
+    assert coalescer.stats['coalesced'] == 1
+
+
+def test_overload_is_rejected_immediately():
+    coalescer = RequestCoalescer(workers=1, max_pending=2)
+    release = threading.Event()
+    coalescer.submit('a', release.wait, 5)
+    coalescer.submit('b', release.wait, 5)
+
+    start = time.perf_counter()
+    with pytest.raises(ServerOverloaded):
+        coalescer.submit('c', release.wait, 5)
+    assert time.perf_counter() - start < 0.5
+
+    # Joining an in-flight key is still allowed
+    coalescer.submit('a', release.wait, 5)
+    release.set()
+    coalescer.executor.shutdown(wait=True)
+    assert coalescer.pending == 0
+
+
+def test_async_callers_share_result():
+    coalescer = RequestCoalescer(workers=2, max_pending=4)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.05)
+        return 'done'
+
+    async def main():
+        return await asyncio.gather(*(coalescer.run('key', compute) for _ in range(5)))
+
+    assert asyncio.run(main()) == ['done'] * 5
+    assert len(calls) == 1
@@ -0,0 +1,102 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import pytest
+
+from shard_router import ShardRouter, ShardUnavailable
+
+# Six books over two shards: book_id % 2 picks the owner
+BOOKS = {book_id: {'book_id': book_id, 'title': f'Book {book_id}', 'num_ratings': ratings}
+         for book_id, ratings in enumerate([5, 9, 9, 1, 7, 3])}
+NEIGHBORS = {book_id: [((book_id + offset) % 6, 1.0 - offset / 10) for offset in (1, 2, 3)] for book_id in BOOKS}
+
+
+class StubShard(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        owned = [book for book_id, book in BOOKS.items() if book_id % 2 == self.server.index]
+        if url.path == '/info':
+            self._send({'shard': self.server.index, 'num_shards': 2, 'model_version': self.server.version})
+        elif url.path == '/titles':
+            self._send({'book_ids': [book['book_id'] for book in owned], 'titles': [book['title'] for book in owned],
+                        'num_ratings': [book['num_ratings'] for book in owned]})
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.requests.append((self.path, payload['book_ids']))
+        if self.path == '/neighbors':
+            self._send({'neighbors': {method: [NEIGHBORS[book_id][:payload['top_n']] for book_id in payload['book_ids']]
+                                      for method in payload['methods']}})
+        else:
+            self._send({'books': [BOOKS[book_id] for book_id in payload['book_ids']]})
+
+    def _send(self, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def shards():
+    servers = []
+    for index, version in ((0, 'v1'), (1, 'v1')):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), StubShard)
+        server.index, server.version, server.requests = index, version, []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    yield servers
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def url_of(server):
+    return f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def test_router_orders_shards_by_index(shards):
+    router = ShardRouter([url_of(shards[1]), url_of(shards[0])])
+    assert router.urls == [url_of(shards[0]), url_of(shards[1])]
+    assert router.model_version == 'v1'
+
+
+def test_batch_merges_neighbors_and_metadata_across_shards(shards):
+    router = ShardRouter([url_of(server) for server in shards])
+    results = router.batch([0, 1, 2], ['content'], 2)['content']
+
+    assert [book['book_id'] for book in results[0]] == [1, 2]
+    assert [book['book_id'] for book in results[1]] == [2, 3]
+    assert results[2][0] == dict(BOOKS[3], score=0.9)
+    # Seeds 0 and 2 share one neighbors request to shard 0
+    assert ('/neighbors', [0, 2]) in shards[0].requests
+    assert ('/neighbors', [1]) in shards[1].requests
+
+
+def test_titles_merge_in_global_order(shards):
+    router = ShardRouter([url_of(server) for server in shards])
+    book_ids, titles, num_ratings = router.titles()
+    assert book_ids == [0, 1, 2, 3, 4, 5]
+    assert titles[3] == 'Book 3' and num_ratings[3] == 1
+
+
+def test_router_rejects_mixed_model_versions(shards):
+    shards[1].version = 'v2'
+    with pytest.raises(ValueError):
+        ShardRouter([url_of(server) for server in shards])
+
+
+def test_unreachable_shard_raises(shards):
+    router = ShardRouter([url_of(server) for server in shards])
+    shards[1].shutdown()
+    shards[1].server_close()
+    with pytest.raises(ShardUnavailable):
+        router.batch([1], ['content'], 2)
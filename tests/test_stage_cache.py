@@ -0,0 +1,92 @@
+import ast
+
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('pandas')
+pytest.importorskip('sklearn')
+
+from config import Config
+from recommendation_engine import RecommendationEngine
+from stage_cache import StageCache
+
+UPSTREAM = {'preprocess': [], 'collaborative': ['preprocess'], 'content': ['preprocess'],
+            'save': ['collaborative', 'content']}
+# Imported by model_manager only to load saved models, never while saving them
+NOT_SAVED = {'hybrid_model'}
+
+
+def save_key(cache):
+    return RecommendationEngine.stage_key(cache, 'save', ['cb', 'cf'])
+
+
+def local_imports(filename):
+    tree = ast.parse((Config.BASE_DIR / 'main' / filename).read_text())
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.module:
+            names.add(node.module)
+        elif isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+    return {name for name in names if (Config.BASE_DIR / 'main' / f'{name}.py').exists()} - {'config'}
+
+
+def covered_sources(stage):
+    sources = set(RecommendationEngine.STAGE_SOURCES[stage])
+    for upstream in UPSTREAM[stage]:
+        sources |= covered_sources(upstream)
+    return sources
+
+
+@pytest.mark.parametrize('stage', list(UPSTREAM))
+def test_stage_sources_include_their_local_imports(stage):
+    covered = covered_sources(stage)
+    for filename in RecommendationEngine.STAGE_SOURCES[stage]:
+        missing = {f'{name}.py' for name in local_imports(filename) - NOT_SAVED} - covered
+        assert not missing, f"{stage} stage reads {sorted(missing)} through {filename}"
+
+
+def test_stage_config_names_exist():
+    for stage, names in RecommendationEngine.STAGE_CONFIG.items():
+        assert all(hasattr(Config, name) for name in names), stage
+
+
+def test_listed_config_change_misses(monkeypatch):
+    key = save_key(StageCache(enabled=False))
+    monkeypatch.setattr(Config, 'SERVING_NEIGHBORS', Config.SERVING_NEIGHBORS + 1)
+    assert save_key(StageCache(enabled=False)) != key
+
+
+def test_unrelated_config_change_hits(monkeypatch):
+    key = save_key(StageCache(enabled=False))
+    monkeypatch.setattr(Config, 'HYBRID_CF_WEIGHT', Config.HYBRID_CF_WEIGHT + 0.1)
+    assert save_key(StageCache(enabled=False)) == key
+
+
+def test_source_change_misses(tmp_path, monkeypatch):
+    main_dir = tmp_path / 'main'
+    main_dir.mkdir()
+    for filename in RecommendationEngine.STAGE_SOURCES['save']:
+        (main_dir / filename).write_bytes((Config.BASE_DIR / 'main' / filename).read_bytes())
+    monkeypatch.setattr(Config, 'BASE_DIR', tmp_path)
+    key = save_key(StageCache(enabled=False))
+    assert save_key(StageCache(enabled=False)) == key
+
+    with open(main_dir / 'title_resolver.py', 'a') as f:
+        f.write("\n# changed\n")
+    assert save_key(StageCache(enabled=False)) != key
+
+
+def test_cached_output_is_reused(tmp_path):
+    calls = []
+    def compute():
+        calls.append(1)
+        return {'rows': 3}
+
+    cache = StageCache(tmp_path)
+    key = cache.key('content', ['upstream'], ['CONTENT_INDEX_MODE'])
+    assert cache.run('content', compute, key) == (key, {'rows': 3})
+    assert StageCache(tmp_path).run('content', compute, key) == (key, {'rows': 3})
+    assert len(calls) == 1
+    assert StageCache(tmp_path).run('content', compute, 'other')[1] == {'rows': 3}
+    assert len(calls) == 2
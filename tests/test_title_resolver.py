@@ -0,0 +1,69 @@
+from title_resolver import TitleResolver, normalize_title
+
+TITLES = [
+    "Harry Potter and the Sorcerer's Stone (Harry Potter (Paperback))",
+    "The Da Vinci Code",
+    "The Lovely Bones: A Novel",
+    "Angels &amp; Demons",
+    "The Lovely Bones",
+]
+
+
+def make_resolver():
+    return TitleResolver(TITLES, popularity=[500, 400, 300, 200, 10])
+
+
+def test_normalize_title():
+    assert normalize_title("  The Lovely-Bones: A NOVEL!! ") == "the lovely bones a novel"
+    assert normalize_title("Café") == "cafe"
+    assert normalize_title(None) == ""
+
+
+def test_exact_title():
+    assert make_resolver().resolve("The Da Vinci Code") == (1, "The Da Vinci Code", 1.0)
+
+
+def test_case_and_punctuation():
+    row, title, score = make_resolver().resolve("the da vinci code.")
+    assert title == "The Da Vinci Code"
+    assert score == 1.0
+
+
+def test_exact_title_beats_popular_subtitled_title():
+    _, title, score = make_resolver().resolve("the lovely bones")
+    assert title == "The Lovely Bones"
+    assert score == 1.0
+
+
+def test_typo_prefers_exact_title_owner():
+    _, title, _ = make_resolver().resolve("the lovely bonez")
+    assert title == "The Lovely Bones"
+
+
+def test_missing_subtitle_prefers_popular_title():
+    resolver = TitleResolver(TITLES[:4], popularity=[500, 400, 300, 200])
+    _, title, _ = resolver.resolve("the lovely bones")
+    assert title == "The Lovely Bones: A Novel"
+
+
+def test_added_title_is_found_exactly():
+    resolver = TitleResolver(TITLES[:4], popularity=[500, 400, 300, 200])
+    row = resolver.add("The Lovely Bones")
+    assert resolver.resolve("The Lovely Bones") == (row, "The Lovely Bones", 1.0)
+
+
+def test_missing_series_suffix():
+    _, title, _ = make_resolver().resolve("harry potter and the sorcerers stone")
+    assert title == TITLES[0]
+
+
+def test_typo():
+    _, title, score = make_resolver().resolve("The Da Vinchi Cod")
+    assert title == "The Da Vinci Code"
+    assert 0.5 <= score < 1.0
+
+
+def test_unknown_title():
+    resolver = make_resolver()
+    assert resolver.resolve("Completely unrelated query") is None
+    assert resolver.resolve("") is None